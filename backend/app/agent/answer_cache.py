@@ -0,0 +1,264 @@
+"""Answer cache for the SQL agent, checked before the model is called.
+
+Questions are normalized (case, punctuation, whitespace) and keyed together with the
+schema fingerprint, so a schema change makes every earlier entry unreachable. Two
+lookups are tried:
+
+- exact: the same normalized question was answered recently; its final answer is
+  replayed.
+- template: the question differs only in its numbers ("top 5 films" vs "top 10 films")
+  from one whose SQL used each of those numbers exactly once. The SQL is re-rendered
+  with the new numbers and run through `run_query`; the rows are then formatted without
+  calling the model.
+
+Only the first question of a thread is looked up or stored, so follow-ups whose meaning
+depends on earlier turns always reach the model and never populate the cache. Answers
+are only stored when a `run_query` in the turn returned rows.
+"""
+
+import json
+import os
+import re
+import unicodedata
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from app.logger import get_logger
+from app.utils.cache import TTLCache
+from app.utils.encoding import columnar_to_records, is_columnar
+
+logger = get_logger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "300"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Rows shown when a template hit is answered without the model
+ANSWER_CACHE_MAX_TABLE_ROWS = int(os.getenv("ANSWER_CACHE_MAX_TABLE_ROWS", "50"))
+
+# Tool calls synthesized from a template hit carry this id prefix
+TOOL_CALL_PREFIX = "answer-cache:"
+
+_QUESTION_TOKEN = re.compile(r"\d+(?:\.\d+)?|[^\W\d_]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# String literals and quoted identifiers are matched first so numbers inside them are
+# skipped
+_SQL_NUMBER = re.compile(
+    r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])"""
+)
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    answer: str
+    sql: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class SQLTemplate:
+    """SQL split around the numeric literals that came from the question."""
+
+    parts: Tuple[str, ...]
+    slots: Tuple[int, ...]
+
+    def render(self, numbers: Sequence[str]) -> str:
+        out = [self.parts[0]]
+        for slot, part in zip(self.slots, self.parts[1:]):
+            out.append(numbers[slot])
+            out.append(part)
+        return "".join(out)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercased words and numbers of `question`, without punctuation."""
+    return " ".join(
+        _QUESTION_TOKEN.findall(unicodedata.normalize("NFKC", question).lower())
+    )
+
+
+def question_template(normalized: str) -> Tuple[str, List[str]]:
+    """Replace the numbers in a normalized question with `#`, returning them in
+    order."""
+    return _NUMBER.sub("#", normalized), _NUMBER.findall(normalized)
+
+
+def sql_template(sql: str, numbers: Sequence[str]) -> Optional[SQLTemplate]:
+    """Template `sql` on `numbers`, or None unless each number is a distinct literal
+    used once."""
+    if not numbers or len(set(numbers)) != len(numbers):
+        return None
+    matches = [m for m in _SQL_NUMBER.finditer(sql) if m.group(1) is not None]
+    literals = [m.group(1) for m in matches]
+    if any(literals.count(n) != 1 for n in numbers):
+        return None
+    parts, slots, start = [], [], 0
+    for m in matches:
+        if m.group(1) in numbers:
+            parts.append(sql[start : m.start(1)])
+            slots.append(numbers.index(m.group(1)))
+            start = m.end(1)
+    parts.append(sql[start:])
+    return SQLTemplate(parts=tuple(parts), slots=tuple(slots))
+
+
+def format_rows(
+    tool_output: str, max_rows: int = ANSWER_CACHE_MAX_TABLE_ROWS
+) -> Optional[str]:
+    """Render a `run_query` result as a Markdown table, or None if it is not a row
+    set."""
+    payload, _, note = tool_output.partition("\n[TRUNCATED")
+    try:
+        rows = json.loads(payload)
+    except ValueError:
+        return None
+    if is_columnar(rows):
+        rows = columnar_to_records(rows)
+    if not isinstance(rows, list) or any(not isinstance(row, dict) for row in rows):
+        return None
+    if not rows:
+        return "The query returned no rows."
+    columns = list(rows[0])
+    if len(rows) == 1 and len(columns) == 1:
+        return f"**{columns[0]}**: {rows[0][columns[0]]}"
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in rows[:max_rows]:
+        lines.append(
+            "| "
+            + " | ".join("" if row.get(c) is None else str(row.get(c)) for c in columns)
+            + " |"
+        )
+    if len(rows) > max_rows or note:
+        lines.append(
+            f"\nShowing {min(len(rows), max_rows)} rows; the full result is larger."
+        )
+    return "\n".join(lines)
+
+
+class AnswerCache:
+    def __init__(self, cache: TTLCache, enabled: bool = True):
+        self.cache = cache
+        self.enabled = enabled
+
+    def lookup(
+        self, messages: Sequence[AnyMessage], fingerprint: str
+    ) -> Optional[AIMessage]:
+        """Answer the pending question from the cache, if possible.
+
+        Returns the final answer for an exact hit, a `run_query` tool call for a
+        template hit, or None on a miss.
+        """
+        question = _pending_question(messages)
+        if not self.enabled or question is None:
+            return None
+        normalized = normalize_question(question)
+        hit = self.cache.get(("exact", fingerprint, normalized))
+        if hit is not None:
+            logger.info(f"Answer cache exact hit: {normalized!r}")
+            return AIMessage(content=hit.answer)
+
+        template, numbers = question_template(normalized)
+        if not numbers:
+            return None
+        sql = self.cache.get(("template", fingerprint, template))
+        if sql is None:
+            return None
+        logger.info(f"Answer cache template hit: {template!r} with {numbers}")
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "run_query",
+                    "args": {"query": sql.render(numbers)},
+                    "id": f"{TOOL_CALL_PREFIX}{uuid.uuid4().hex}",
+                    "type": "tool_call",
+                }
+            ],
+        )
+
+    def answer_tool_result(self, messages: Sequence[AnyMessage]) -> Optional[AIMessage]:
+        """Format the result of a tool call made by `lookup` without calling the
+        model."""
+        last = messages[-1] if messages else None
+        if not (
+            isinstance(last, ToolMessage)
+            and last.tool_call_id.startswith(TOOL_CALL_PREFIX)
+        ):
+            return None
+        answer = format_rows(last.content) if isinstance(last.content, str) else None
+        # On errors the model takes over and sees the failed call like any other
+        return AIMessage(content=answer) if answer is not None else None
+
+    def remember(
+        self, messages: Sequence[AnyMessage], answer: str, fingerprint: str
+    ) -> None:
+        """Store the final `answer` to the thread's first question, with the SQL behind
+        it.
+
+        Turns without a `run_query` that returned rows are not stored: their answer is
+        the model explaining a failed, rejected or timed-out query, not an answer to
+        replay.
+        """
+        humans = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        if (
+            not self.enabled
+            or len(humans) != 1
+            or not isinstance(messages[humans[0]].content, str)
+        ):
+            return
+        sql = _answering_sql(messages[humans[0] + 1 :])
+        if sql is None:
+            return
+        normalized = normalize_question(messages[humans[0]].content)
+        self.cache.set(
+            ("exact", fingerprint, normalized), CachedAnswer(answer=answer, sql=sql)
+        )
+        template, numbers = question_template(normalized)
+        templated = sql_template(sql, numbers)
+        if templated is not None:
+            self.cache.set(("template", fingerprint, template), templated)
+
+    def invalidate(self) -> int:
+        return self.cache.invalidate()
+
+    def stats(self) -> Dict[str, object]:
+        return {**self.cache.stats(), "enabled": self.enabled}
+
+
+def _pending_question(messages: Sequence[AnyMessage]) -> Optional[str]:
+    """The pending question if it is the thread's first; follow-ups may depend on
+    earlier turns."""
+    last = messages[-1] if messages else None
+    if not (isinstance(last, HumanMessage) and isinstance(last.content, str)):
+        return None
+    if sum(isinstance(m, HumanMessage) for m in messages) != 1:
+        return None
+    return last.content
+
+
+def _answering_sql(turn: Sequence[AnyMessage]) -> Optional[str]:
+    """The last `run_query` statement of the turn that returned rows rather than an
+    error."""
+    results = {m.tool_call_id: m.content for m in turn if isinstance(m, ToolMessage)}
+    sql = None
+    for message in turn:
+        for call in getattr(message, "tool_calls", None) or []:
+            content = results.get(call["id"])
+            if (
+                call["name"] == "run_query"
+                and isinstance(content, str)
+                and content.startswith(("[", '{"schema"'))
+            ):
+                sql = call["args"].get("query")
+    return sql
+
+
+answer_cache = AnswerCache(
+    TTLCache(max_bytes=ANSWER_CACHE_MAX_BYTES, default_ttl=ANSWER_CACHE_TTL),
+    enabled=ANSWER_CACHE_ENABLED,
+)
@@ -0,0 +1,244 @@
+"""Conversation checkpointers for the agent graph.
+
+`MemorySaver` keeps every checkpoint of every thread for the life of the process.
+`BoundedMemorySaver` caps that:
+
+- threads idle for longer than `CHECKPOINT_TTL` seconds are dropped;
+- at most `CHECKPOINT_MAX_THREADS` threads are kept (least recently used evicted first);
+- only the newest `CHECKPOINT_KEEP_PER_THREAD` checkpoints per thread are kept, together
+  with their pending writes and the channel blobs they reference.
+
+Set `CHECKPOINTER=sqlite` to keep checkpoints on disk instead (needs
+`langgraph-checkpoint-sqlite`), or `CHECKPOINTER=memory` for the unbounded saver.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "bounded").lower()
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", "3600"))
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "2"))
+CHECKPOINT_SQLITE_PATH = os.getenv(
+    "CHECKPOINT_SQLITE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "checkpoints.sqlite"),
+)
+# Seconds between sweeps for expired threads
+_SWEEP_INTERVAL = 30.0
+
+
+class BoundedMemorySaver(MemorySaver):
+    """In-memory checkpointer with a per-thread TTL, an LRU thread cap and checkpoint
+    pruning."""
+
+    def __init__(
+        self,
+        ttl: float = CHECKPOINT_TTL,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        keep_per_thread: int = CHECKPOINT_KEEP_PER_THREAD,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.keep_per_thread = max(keep_per_thread, 1)
+        self._lock = threading.RLock()
+        # thread_id -> last access (monotonic), least recently used first
+        self._access: OrderedDict[str, float] = OrderedDict()
+        # (thread_id, checkpoint_ns, checkpoint_id) -> channel versions the checkpoint
+        # references
+        self._versions: Dict[Tuple[str, str, str], ChannelVersions] = {}
+        self._swept_at = time.monotonic()
+        self._stats = {
+            "expired_threads": 0,
+            "evicted_threads": 0,
+            "pruned_checkpoints": 0,
+        }
+
+    def get_tuple(self, config: RunnableConfig):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(
+                checkpoint["channel_versions"]
+            )
+            self._touch(thread_id)
+            self._prune(thread_id, checkpoint_ns)
+            self._enforce_limits(exclude=thread_id)
+            return saved
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self._touch(config["configurable"]["thread_id"])
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._access.pop(thread_id, None)
+            for key in [k for k in self._versions if k[0] == thread_id]:
+                del self._versions[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Thread and checkpoint counts with the serialized size of everything held."""
+        with self._lock:
+            checkpoint_bytes = sum(
+                len(c[1]) + len(m[1])
+                for namespaces in self.storage.values()
+                for checkpoints in namespaces.values()
+                for c, m, _ in checkpoints.values()
+            )
+            write_bytes = sum(
+                len(w[2][1]) for writes in self.writes.values() for w in writes.values()
+            )
+            blob_bytes = sum(len(b[1]) for b in self.blobs.values())
+            return {
+                **self._stats,
+                "backend": "bounded",
+                "threads": len(self.storage),
+                "max_threads": self.max_threads,
+                "ttl_seconds": self.ttl,
+                "keep_per_thread": self.keep_per_thread,
+                "checkpoints": sum(
+                    len(c) for ns in self.storage.values() for c in ns.values()
+                ),
+                "blobs": len(self.blobs),
+                "bytes": checkpoint_bytes + write_bytes + blob_bytes,
+                "checkpoint_bytes": checkpoint_bytes,
+                "write_bytes": write_bytes,
+                "blob_bytes": blob_bytes,
+            }
+
+    def _touch(self, thread_id: str) -> None:
+        self._access[thread_id] = time.monotonic()
+        self._access.move_to_end(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Drop all but the newest checkpoints of one thread namespace, and what only
+        they used."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_per_thread:
+            return
+        # Checkpoint ids are time-ordered (uuid6), so sorting them sorts by age
+        ordered = sorted(checkpoints)
+        stale, kept = ordered[: -self.keep_per_thread], ordered[-self.keep_per_thread :]
+        for checkpoint_id in stale:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        self._stats["pruned_checkpoints"] += len(stale)
+
+        referenced: Set[Tuple[str, Any]] = set()
+        for checkpoint_id in kept:
+            referenced.update(
+                self._versions.get(
+                    (thread_id, checkpoint_ns, checkpoint_id), {}
+                ).items()
+            )
+        for key in [
+            k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns
+        ]:
+            if (key[2], key[3]) not in referenced:
+                del self.blobs[key]
+
+    def _enforce_limits(self, exclude: str) -> None:
+        now = time.monotonic()
+        if self.ttl > 0 and now - self._swept_at >= _SWEEP_INTERVAL:
+            self._swept_at = now
+            expired = [
+                t
+                for t, seen in self._access.items()
+                if now - seen > self.ttl and t != exclude
+            ]
+            for thread_id in expired:
+                self.delete_thread(thread_id)
+            if expired:
+                self._stats["expired_threads"] += len(expired)
+                logger.info(f"Dropped {len(expired)} idle conversation threads")
+        while len(self._access) > self.max_threads:
+            thread_id = next(iter(self._access))
+            if thread_id == exclude:
+                break
+            self.delete_thread(thread_id)
+            self._stats["evicted_threads"] += 1
+
+
+def build_checkpointer(backend: str = CHECKPOINTER) -> BaseCheckpointSaver:
+    """Create the checkpointer selected by `CHECKPOINTER` (bounded, memory or
+    sqlite)."""
+    logger.info(f"Entering build_checkpointer: {backend}")
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "bounded":
+        return BoundedMemorySaver()
+    if backend == "sqlite":
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            msg = (
+                "CHECKPOINTER=sqlite needs the SQLite checkpointer. "
+                "Install it with: pip install langgraph-checkpoint-sqlite aiosqlite"
+            )
+            logger.exception(msg)
+            raise RuntimeError(msg) from e
+        os.makedirs(
+            os.path.dirname(os.path.abspath(CHECKPOINT_SQLITE_PATH)), exist_ok=True
+        )
+        # The connection is opened lazily by the saver on first use, inside the server's
+        # event loop
+        return AsyncSqliteSaver(aiosqlite.connect(CHECKPOINT_SQLITE_PATH))
+    raise ValueError(
+        f"Unknown CHECKPOINTER {backend!r}; expected 'bounded', 'memory' or 'sqlite'"
+    )
+
+
+def checkpointer_stats(checkpointer: BaseCheckpointSaver) -> Dict[str, Any]:
+    if isinstance(checkpointer, BoundedMemorySaver):
+        return checkpointer.stats()
+    if isinstance(checkpointer, MemorySaver):
+        return {
+            "backend": "memory",
+            "threads": len(checkpointer.storage),
+            "blobs": len(checkpointer.blobs),
+        }
+    stats: Dict[str, Any] = {"backend": type(checkpointer).__name__}
+    if CHECKPOINTER == "sqlite" and os.path.exists(CHECKPOINT_SQLITE_PATH):
+        stats["file_bytes"] = os.path.getsize(CHECKPOINT_SQLITE_PATH)
+    return stats
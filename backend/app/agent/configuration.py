@@ -5,10 +5,11 @@ from __future__ import annotations
 from dataclasses import dataclass, field, fields
 from typing import Annotated
 
-from app.agent import prompts
 from langchain_core.runnables import ensure_config
 from langgraph.config import get_config
 
+from app.agent import prompts
+
 
 @dataclass(kw_only=True)
 class Configuration:
@@ -35,7 +36,41 @@ class Configuration:
 
     max_search_results: int = field(
         default=10,
-        metadata={"description": "The maximum number of search results to return for each search query."},
+        metadata={
+            "description": (
+                "The maximum number of search results to return for each search query."
+            )
+        },
+    )
+
+    max_prompt_tokens: int = field(
+        default=16000,
+        metadata={
+            "description": (
+                "Token budget for the prompt sent to the model on each step. "
+                "Older turns are dropped once the conversation exceeds it; "
+                "0 disables the cap."
+            ),
+        },
+    )
+
+    keep_recent_turns: int = field(
+        default=2,
+        metadata={
+            "description": (
+                "Number of most recent conversation turns sent to the model verbatim."
+            )
+        },
+    )
+
+    tool_result_summary_chars: int = field(
+        default=300,
+        metadata={
+            "description": (
+                "Maximum length of the summaries that replace tool "
+                "results in older turns."
+            )
+        },
     )
 
     @classmethod
@@ -0,0 +1,240 @@
+"""Token-budgeted prompt construction for `call_model`.
+
+The conversation is split into turns (a user message and everything the agent did in
+reply). The newest `keep_recent_turns` turns are sent verbatim. Older turns keep their
+messages, but tool results are compacted to a one-line summary. If the prompt is still
+over `max_prompt_tokens`, whole old turns are dropped, oldest first, so tool calls and
+their results are never separated. When the turns that are left still do not fit, their
+tool results are cut to their head plus a TRUNCATED note, largest first.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.logger import get_logger
+from app.utils.encoding import columnar_to_records, is_columnar
+
+logger = get_logger(__name__)
+
+# Per-message overhead of the chat format (role markers, separators)
+_MESSAGE_OVERHEAD = 4
+_COUNT_CACHE_SIZE = 4096
+_count_cache: "OrderedDict[Any, int]" = OrderedDict()
+# Summaries are at most `tool_result_summary_chars` long, so this stays small; keys
+# never hold the (possibly 256 KB) result text itself
+_SUMMARY_CACHE_SIZE = 1024
+_summary_cache: "OrderedDict[Any, str]" = OrderedDict()
+# Tool results cut to fit the budget keep at least this many tokens of their head
+_MIN_RESULT_TOKENS = 64
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[Any]:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE tables on first use; fall back to an estimate when
+        # offline
+        logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _message_text(message: AnyMessage) -> str:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += json.dumps(
+            [{"name": c["name"], "args": c["args"]} for c in tool_calls], default=str
+        )
+    return content
+
+
+def message_tokens(message: AnyMessage) -> int:
+    """Token count of one message, memoized by message id and content length."""
+    key = (
+        (message.id, type(message).__name__, len(str(message.content)))
+        if message.id
+        else None
+    )
+    if key is not None and key in _count_cache:
+        _count_cache.move_to_end(key)
+        return _count_cache[key]
+    tokens = count_tokens(_message_text(message)) + _MESSAGE_OVERHEAD
+    if key is not None:
+        _count_cache[key] = tokens
+        if len(_count_cache) > _COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return tokens
+
+
+def summarize_tool_result(text: str, max_chars: int) -> str:
+    """Short stand-in for an old tool result, e.g. row count, columns and the first
+    row."""
+    if len(text) <= max_chars:
+        return text
+    payload = text.partition("\n[TRUNCATED")[0]
+    try:
+        rows = json.loads(payload)
+    except ValueError:
+        rows = None
+    if is_columnar(rows):
+        rows = columnar_to_records(rows)
+    if isinstance(rows, list) and rows and isinstance(rows[0], dict):
+        summary = (
+            f"[earlier result: {len(rows)} rows, columns {', '.join(rows[0])}; first "
+            f"row {json.dumps(rows[0], default=str)}"
+        )
+    else:
+        summary = f"[earlier result, {len(text)} chars: {text[:max_chars]}"
+    if len(summary) > max_chars:
+        summary = summary[:max_chars] + "..."
+    return summary + "]"
+
+
+def truncate_tool_result(text: str, max_tokens: int) -> str:
+    """The head of `text` that fits in about `max_tokens`, followed by a TRUNCATED
+    note."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    note = (
+        f"\n[TRUNCATED: cut to fit the prompt budget, {len(text)} chars in full. "
+        "Aggregate, filter or add a LIMIT to see the rest.]"
+    )
+    budget = max(max_tokens - count_tokens(note), 0)
+    keep = len(text) * budget // tokens
+    while keep and count_tokens(text[:keep]) > budget:
+        keep = keep * 4 // 5
+    return text[:keep] + note
+
+
+def _summarize_message(message: ToolMessage, text: str, max_chars: int) -> str:
+    """`summarize_tool_result`, memoized by message id (or a digest of the text when it
+    has none)."""
+    ident = message.id or hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+    key = (ident, len(text), max_chars)
+    if key in _summary_cache:
+        _summary_cache.move_to_end(key)
+        return _summary_cache[key]
+    summary = summarize_tool_result(text, max_chars)
+    _summary_cache[key] = summary
+    if len(_summary_cache) > _SUMMARY_CACHE_SIZE:
+        _summary_cache.popitem(last=False)
+    return summary
+
+
+@dataclass
+class Prompt:
+    messages: List[AnyMessage]
+    tokens: int
+    dropped_turns: int
+    compacted_results: int
+    truncated_results: int = 0
+
+
+def split_turns(messages: Sequence[AnyMessage]) -> List[List[AnyMessage]]:
+    turns: List[List[AnyMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def build_prompt(
+    system_prompt: str,
+    messages: Sequence[AnyMessage],
+    max_tokens: int,
+    keep_recent_turns: int,
+    tool_result_summary_chars: int,
+) -> Prompt:
+    """System message plus as much of `messages` as fits in `max_tokens` (0 disables the
+    cap)."""
+    turns = split_turns(messages)
+    keep_recent_turns = max(keep_recent_turns, 1)
+    compacted = 0
+    for turn in turns[:-keep_recent_turns]:
+        for i, message in enumerate(turn):
+            if isinstance(message, ToolMessage):
+                content = message.content
+                text = (
+                    content
+                    if isinstance(content, str)
+                    else json.dumps(content, default=str)
+                )
+                summary = _summarize_message(message, text, tool_result_summary_chars)
+                if summary != message.content:
+                    turn[i] = message.model_copy(update={"content": summary})
+                    compacted += 1
+
+    system = SystemMessage(content=system_prompt)
+    turn_tokens = [sum(message_tokens(m) for m in turn) for turn in turns]
+    total = count_tokens(system_prompt) + _MESSAGE_OVERHEAD + sum(turn_tokens)
+    dropped = 0
+    # The current turn is always sent, so it is never dropped
+    while max_tokens > 0 and total > max_tokens and dropped < len(turns) - 1:
+        total -= turn_tokens[dropped]
+        dropped += 1
+
+    kept_turns = turns[dropped:]
+    truncated = 0
+    if max_tokens > 0 and total > max_tokens:
+        # Still over: cut the tool results that are left, largest first
+        results = sorted(
+            (
+                (message_tokens(m), t, i)
+                for t, turn in enumerate(kept_turns)
+                for i, m in enumerate(turn)
+                if isinstance(m, ToolMessage)
+            ),
+            reverse=True,
+        )
+        for tokens, t, i in results:
+            if total <= max_tokens:
+                break
+            message = kept_turns[t][i]
+            content = message.content
+            text = (
+                content
+                if isinstance(content, str)
+                else json.dumps(content, default=str)
+            )
+            target = max(
+                tokens - _MESSAGE_OVERHEAD - (total - max_tokens), _MIN_RESULT_TOKENS
+            )
+            cut = message.model_copy(
+                update={"content": truncate_tool_result(text, target)}
+            )
+            kept_turns[t][i] = cut
+            total += message_tokens(cut) - tokens
+            truncated += 1
+    if max_tokens > 0 and total > max_tokens:
+        logger.warning(
+            f"Prompt of {total} tokens exceeds the {max_tokens} token budget"
+        )
+
+    kept = [m for turn in kept_turns for m in turn]
+    return Prompt(
+        messages=[system, *kept],
+        tokens=total,
+        dropped_turns=dropped,
+        compacted_results=compacted,
+        truncated_results=truncated,
+    )
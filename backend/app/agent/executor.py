@@ -0,0 +1,119 @@
+"""Bounded thread pool for the agent's blocking database calls.
+
+The agent tools are coroutines running on the server's event loop, while SQLDatabase
+talks to PostgreSQL synchronously. Work submitted here runs on at most
+`AGENT_DB_MAX_WORKERS` threads, so a slow query only occupies one worker instead of
+freezing every other stream on the loop. Once `AGENT_DB_MAX_QUEUE` calls are waiting,
+new calls fail fast.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from app.db.database import DB_POOL_SIZE
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+AGENT_DB_MAX_WORKERS = int(os.getenv("AGENT_DB_MAX_WORKERS", str(DB_POOL_SIZE)))
+AGENT_DB_MAX_QUEUE = int(os.getenv("AGENT_DB_MAX_QUEUE", "64"))
+
+T = TypeVar("T")
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when too many database calls are already waiting for a worker."""
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers: int, max_queue: int, name: str):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_queued": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `fn(*args, **kwargs)` on a worker thread and await its result.
+
+        The caller's context variables are visible inside `fn`.
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise ExecutorSaturated(
+                    f"{self._queued} database calls are already "
+                    "waiting; try again shortly"
+                )
+            self._queued += 1
+            self._stats["submitted"] += 1
+            self._stats["max_queued"] = max(self._stats["max_queued"], self._queued)
+
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def work() -> T:
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                waited = started - submitted
+                self._stats["wait_seconds_total"] += waited
+                self._stats["wait_seconds_max"] = max(
+                    self._stats["wait_seconds_max"], waited
+                )
+            failed = False
+            try:
+                return context.run(fn, *args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats["failed" if failed else "completed"] += 1
+                    self._stats["run_seconds_total"] += time.perf_counter() - started
+
+        future = self._executor.submit(work)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call cancelled before a worker picked it up never decrements the queue
+            # itself
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+            }
+
+
+db_executor = BoundedExecutor(
+    max_workers=AGENT_DB_MAX_WORKERS, max_queue=AGENT_DB_MAX_QUEUE, name="agent-db"
+)
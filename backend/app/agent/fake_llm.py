@@ -0,0 +1,268 @@
+"""Scripted chat model for running the agent without a model provider
+(`MODEL_PROVIDER=fake`).
+
+The model replays a script: the first rule whose `match` pattern is found in the latest
+user message supplies the steps for that turn, one step per model call. A step is either
+a tool call (`{"tool": "run_query", "args": {...}}`) or a final answer (`{"answer":
+"..."}`, where `{result}` is replaced by the last tool result). A custom script can be
+loaded from `FAKE_LLM_SCRIPT`:
+
+    [{"match": "revenue",
+      "steps": [{"tool": "run_query",
+                 "args": {"query": "SELECT sum(amount) FROM payment"}},
+                {"answer": "Total revenue: {result}"}]}]
+
+`FAKE_LLM_LATENCY_MS` delays the first token and `FAKE_LLM_TOKENS_PER_SECOND` paces the
+remaining ones, so streaming and end-to-end latency look like a real provider's.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+FAKE_LLM_SCRIPT = os.getenv("FAKE_LLM_SCRIPT")
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+# 0 emits the whole response at once after the initial latency
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0"))
+_RESULT_PREVIEW_CHARS = 500
+
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {
+        "match": "revenue|sales",
+        "steps": [
+            {"tool": "get_schema", "args": {}},
+            {
+                "tool": "run_query",
+                "args": {"query": "SELECT sum(amount) AS total_revenue FROM payment"},
+            },
+            {"answer": "The total revenue is {result}."},
+        ],
+    },
+    {
+        "match": "film|movie",
+        "steps": [
+            {"tool": "get_schema", "args": {}},
+            {
+                "tool": "run_query",
+                "args": {
+                    "query": "SELECT f.title, count(r.rental_id) AS rentals "
+                    "FROM film f JOIN inventory i ON i.film_id = f.film_id "
+                    "JOIN rental r ON r.inventory_id = i.inventory_id "
+                    "GROUP BY f.title ORDER BY rentals DESC LIMIT 10"
+                },
+            },
+            {"answer": "Here are the most rented films: {result}"},
+        ],
+    },
+    {
+        "match": "",
+        "steps": [
+            {"tool": "get_schema", "args": {}},
+            {
+                "tool": "run_query",
+                "args": {"query": "SELECT count(*) AS customers FROM customer"},
+            },
+            {"answer": "I looked at the data: {result}"},
+        ],
+    },
+]
+
+
+def load_script(path: Optional[str] = FAKE_LLM_SCRIPT) -> List[Dict[str, Any]]:
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path) as f:
+        return json.load(f)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model that follows a script instead of calling a provider."""
+
+    script: List[Dict[str, Any]]
+    latency_ms: float = 0.0
+    tokens_per_second: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        return cls(
+            script=load_script(),
+            latency_ms=FAKE_LLM_LATENCY_MS,
+            tokens_per_second=FAKE_LLM_TOKENS_PER_SECOND,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-scripted"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        # The script already names the tools to call
+        return self
+
+    def next_message(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """The scripted reply for the current position in the conversation."""
+        turn_start = max(
+            (i for i, m in enumerate(messages) if isinstance(m, HumanMessage)),
+            default=-1,
+        )
+        question = messages[turn_start].content if turn_start >= 0 else ""
+        step_index = sum(
+            1 for m in messages[turn_start + 1 :] if isinstance(m, AIMessage)
+        )
+        steps = next(
+            (
+                rule["steps"]
+                for rule in self.script
+                if re.search(rule.get("match", ""), str(question), re.IGNORECASE)
+            ),
+            [{"answer": "I have no scripted answer for that."}],
+        )
+        step = steps[min(step_index, len(steps) - 1)]
+        if "tool" in step:
+            call_id = f"call_{uuid.uuid4().hex[:12]}"
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": step["tool"],
+                        "args": step.get("args", {}),
+                        "id": call_id,
+                        "type": "tool_call",
+                    }
+                ],
+                usage_metadata=_usage(messages, json.dumps(step.get("args", {}))),
+            )
+        result = next(
+            (m.content for m in reversed(messages) if isinstance(m, ToolMessage)), ""
+        )
+        answer = step["answer"].replace("{result}", str(result)[:_RESULT_PREVIEW_CHARS])
+        return AIMessage(content=answer, usage_metadata=_usage(messages, answer))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.next_message(messages)
+        time.sleep(self._total_delay(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.next_message(messages)
+        await asyncio.sleep(self._total_delay(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self.next_message(messages)
+        time.sleep(self.latency_ms / 1000)
+        for chunk, delay in self._chunks(message):
+            time.sleep(delay)
+            if run_manager and chunk.text:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self.next_message(messages)
+        await asyncio.sleep(self.latency_ms / 1000)
+        for chunk, delay in self._chunks(message):
+            await asyncio.sleep(delay)
+            if run_manager and chunk.text:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _chunks(self, message: AIMessage) -> Iterator[tuple]:
+        """Split `message` into streamed chunks paired with the delay before each
+        one."""
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        message_id = f"run-{uuid.uuid4()}"
+        if message.tool_calls:
+            for index, call in enumerate(message.tool_calls):
+                chunk = AIMessageChunk(
+                    content="",
+                    id=message_id,
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": json.dumps(call["args"]),
+                            "id": call["id"],
+                            "index": index,
+                        }
+                    ],
+                )
+                yield ChatGenerationChunk(message=chunk), delay
+        else:
+            for token in re.findall(r"\S+\s*|\s+", message.content):
+                yield (
+                    ChatGenerationChunk(
+                        message=AIMessageChunk(content=token, id=message_id)
+                    ),
+                    delay,
+                )
+        yield (
+            ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="", id=message_id, usage_metadata=message.usage_metadata
+                )
+            ),
+            0.0,
+        )
+
+    def _total_delay(self, message: AIMessage) -> float:
+        tokens = (
+            message.usage_metadata["output_tokens"] if message.usage_metadata else 0
+        )
+        per_token = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return self.latency_ms / 1000 + tokens * per_token
+
+
+def _usage(messages: Sequence[BaseMessage], output: str) -> Dict[str, int]:
+    """Token counts estimated from text length, so token metrics have realistic
+    values."""
+    input_tokens = sum(len(str(m.content)) for m in messages) // 4 + 1
+    output_tokens = len(output) // 4 + 1
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+    }
@@ -3,23 +3,41 @@
 Works with a chat model with tool calling support.
 """
 
-from typing import Dict, List, Literal, cast
+import time
+from typing import Dict, List, Literal, Optional, cast
 
-from app.agent.configuration import Configuration
-from app.agent.state import AgentState, InputState, SQLAgentState
-from app.agent.tools import TOOLS
-from app.agent.utils import load_chat_model
 from dotenv import load_dotenv
+from fastapi import HTTPException
 from langchain_core.messages import AIMessage
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
+
+from app.agent.answer_cache import answer_cache
+from app.agent.checkpointer import build_checkpointer
+from app.agent.configuration import Configuration
+from app.agent.context import build_prompt
+from app.agent.executor import db_executor
+from app.agent.state import AgentState, InputState, SQLAgentState
+from app.agent.tools import TOOLS, db
+from app.agent.utils import load_chat_model
 from app.logger import get_logger
+from app.metrics import AGENT_CACHED_STEPS, record_llm_call
 
 logger = get_logger(__name__)
 
 load_dotenv()
 
+
+async def _schema_fingerprint() -> Optional[str]:
+    """Current schema fingerprint for answer cache keys, or None if the schema cannot be
+    read."""
+    try:
+        return await db_executor.run(lambda: db.schema_cache.fingerprint)
+    except Exception as e:
+        logger.warning(f"Skipping answer cache, schema unavailable: {e}")
+        return None
+
+
 # Define the function that calls the model
 async def call_model(state: AgentState) -> Dict[str, List[AIMessage]]:
     logger.info("Entering call_model")
@@ -37,19 +55,61 @@ async def call_model(state: AgentState) -> Dict[str, List[AIMessage]]:
     try:
         configuration = Configuration.from_context()
 
+        # Repeated questions are answered from the cache before any model call
+        fingerprint = await _schema_fingerprint() if answer_cache.enabled else None
+        if fingerprint is not None:
+            formatted = answer_cache.answer_tool_result(state.messages)
+            if formatted is not None:
+                answer_cache.remember(state.messages, formatted.content, fingerprint)
+                AGENT_CACHED_STEPS.labels("template_result").inc()
+                return {"messages": [formatted]}
+            cached = answer_cache.lookup(state.messages, fingerprint)
+            if cached is not None:
+                AGENT_CACHED_STEPS.labels(
+                    "template" if cached.tool_calls else "exact"
+                ).inc()
+                return {"messages": [cached]}
+
         # Initialize the model with tool binding. Change the model or add more tools here.
-        model = load_chat_model(configuration.model).bind_tools(TOOLS)
-        logger.info(f"Model loaded: {configuration.model} | {model}")
+        started = time.perf_counter()
+        # Cached per model with TOOLS bound (see load_chat_model); counted at
+        # /admin/agent/models
+        model = load_chat_model(configuration.model, tools=TOOLS)
+        logger.info(
+            f"Model ready: {configuration.model} "
+            f"({(time.perf_counter() - started) * 1000:.2f} ms)"
+        )
 
         # Format the system prompt. Customize this to change the agent's behavior.
         system_message = configuration.system_prompt
 
-        logger.info(f"System message: {system_message}")
-        logger.info(f"state.messages: {state.messages}")
+        logger.debug(f"System message: {len(system_message)} chars")
+        # Keep recent turns verbatim, compact old tool results and cap the prompt size
+        prompt = build_prompt(
+            system_message,
+            state.messages,
+            max_tokens=configuration.max_prompt_tokens,
+            keep_recent_turns=configuration.keep_recent_turns,
+            tool_result_summary_chars=configuration.tool_result_summary_chars,
+        )
+        logger.info(
+            f"Prompt: {len(prompt.messages)} of {len(state.messages) + 1} messages, "
+            f"{prompt.tokens} tokens ({prompt.dropped_turns} turns dropped, "
+            f"{prompt.compacted_results} tool results compacted, "
+            f"{prompt.truncated_results} truncated)"
+        )
         # Get the model's response
-        response = cast(
-            AIMessage,
-            await model.ainvoke([{"role": "system", "content": system_message}, *state.messages]),
+        started = time.perf_counter()
+        try:
+            response = cast(AIMessage, await model.ainvoke(prompt.messages))
+        except Exception:
+            record_llm_call(configuration.model, time.perf_counter() - started, "error")
+            raise
+        record_llm_call(
+            configuration.model,
+            time.perf_counter() - started,
+            "tool_calls" if response.tool_calls else "answer",
+            response.usage_metadata,
         )
 
         # Handle the case when it's the last step and the model still wants to use a tool
@@ -63,13 +123,24 @@ async def call_model(state: AgentState) -> Dict[str, List[AIMessage]]:
                 ]
             }
 
+        if (
+            fingerprint is not None
+            and not response.tool_calls
+            and isinstance(response.content, str)
+        ):
+            answer_cache.remember(state.messages, response.content, fingerprint)
+
         # Return the model's response as a list to be added to existing messages
-        logger.info(f"Exiting call_model with LLM response: {response}")
+        logger.info(
+            f"Exiting call_model: {len(str(response.content))} chars, "
+            f"tool calls {[call['name'] for call in response.tool_calls]}"
+        )
         return {"messages": [response]}
     except Exception as e:
         logger.error(f"Error in call_model: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
 # Define a new graph
 builder = StateGraph(AgentState, input=InputState, config_schema=Configuration)
 
@@ -87,7 +158,9 @@ def route_model_output(state: SQLAgentState) -> Literal["__end__", "tools"]:
     logger.info("Entering route_model_output")
     last_message = state.messages[-1]
     if not isinstance(last_message, AIMessage):
-        raise ValueError(f"Expected AIMessage in output edges, but got {type(last_message).__name__}")
+        raise ValueError(
+            f"Expected AIMessage in output edges, but got {type(last_message).__name__}"
+        )
 
     # If there is no tool call, then we finish
     if not last_message.tool_calls:
@@ -113,8 +186,9 @@ builder.add_conditional_edges(
 # This creates a cycle: after using tools, we always return to the model
 builder.add_edge("tools", "call_model")
 
-# Compile the builder into an executable graph
-memory = MemorySaver()
+# Compile the builder into an executable graph. The checkpointer bounds how much
+# conversation history the process keeps (see app.agent.checkpointer / CHECKPOINTER).
+memory = build_checkpointer()
 graph = builder.compile(name="powersim_agent", checkpointer=memory)
 
 if __name__ == "__main__":
@@ -145,7 +219,7 @@ if __name__ == "__main__":
                 logger.info(f"\n--- OUTPUT FROM NODE: {node_name} ---")
 
                 # Extract messages if they exist
-                if "messages" in node_output and node_output["messages"]:
+                if node_output.get("messages"):
                     latest_message = node_output["messages"][-1]
 
                     # Print message content based on type
@@ -155,11 +229,16 @@ if __name__ == "__main__":
                         logger.info(f"CONTENT: {latest_message.content[:500]}...")
 
                     # Print tool calls if present
-                    if hasattr(latest_message, "tool_calls") and latest_message.tool_calls:
+                    if (
+                        hasattr(latest_message, "tool_calls")
+                        and latest_message.tool_calls
+                    ):
                         logger.info(f"TOOL CALLS: {latest_message.tool_calls}")
 
                     # Handle tool messages specifically
-                    if hasattr(latest_message, "name") and hasattr(latest_message, "tool_call_id"):
+                    if hasattr(latest_message, "name") and hasattr(
+                        latest_message, "tool_call_id"
+                    ):
                         logger.info(f"TOOL: {latest_message.name}")
                         logger.info(f"TOOL CALL ID: {latest_message.tool_call_id}")
                         if hasattr(latest_message, "content"):
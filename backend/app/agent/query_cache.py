@@ -0,0 +1,85 @@
+"""Result cache for agent SQL keyed on a normalized statement fingerprint.
+
+Statements that differ only in whitespace, comments, keyword/identifier case or a
+trailing semicolon share one entry. String literals and quoted identifiers are kept
+verbatim.
+"""
+
+import os
+import re
+
+import xxhash
+
+from app.utils.cache import TTLCache
+
+AGENT_QUERY_CACHE_ENABLED = os.getenv("AGENT_QUERY_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+AGENT_QUERY_CACHE_TTL = float(os.getenv("AGENT_QUERY_CACHE_TTL", "300"))
+AGENT_QUERY_CACHE_MAX_BYTES = int(
+    os.getenv("AGENT_QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+_TOKEN = re.compile(
+    r"""'(?:[^']|'')*'       # string literal
+      | "(?:[^"]|"")*"       # quoted identifier
+      | --[^\n]*             # line comment
+      | /\*.*?\*/            # block comment
+      | \s+
+      | [^'"\s/-]+
+      | .""",
+    re.DOTALL | re.VERBOSE,
+)
+# Checked on the normalized text, so leading comments are already gone; parentheses may
+# wrap it
+_READ_STATEMENT = re.compile(r"^\(*(select|with|values|table)\b")
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form of `sql` used for fingerprinting (never executed)."""
+    out = []
+    pending_space = False
+    for token in _TOKEN.findall(sql):
+        if token.isspace() or token.startswith(("--", "/*")):
+            pending_space = True
+            continue
+        if token[0] not in "'\"":
+            token = token.lower()
+        # Whitespace only matters between two word characters ("select a" vs "selecta")
+        # and between operator characters that would otherwise form a comment ("- -" vs
+        # "--")
+        if pending_space and out and _needs_space(out[-1][-1], token[0]):
+            out.append(" ")
+        out.append(token)
+        pending_space = False
+    return "".join(out).rstrip(";")
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char in "_$"
+
+
+def _needs_space(left: str, right: str) -> bool:
+    return (_is_word(left) and _is_word(right)) or (left in "-/*" and right in "-/*")
+
+
+def sql_fingerprint(sql: str) -> str:
+    return xxhash.xxh3_64_hexdigest(normalize_sql(sql))
+
+
+def is_read_statement(sql: str) -> bool:
+    """Whether `sql` is a plain read (SELECT, WITH, VALUES or TABLE), ignoring comments
+    and parentheses."""
+    return bool(_READ_STATEMENT.match(normalize_sql(sql)))
+
+
+def is_cacheable(sql: str) -> bool:
+    """Only plain read statements are cached."""
+    return is_read_statement(sql)
+
+
+query_cache = TTLCache(
+    max_bytes=AGENT_QUERY_CACHE_MAX_BYTES, default_ttl=AGENT_QUERY_CACHE_TTL
+)
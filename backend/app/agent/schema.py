@@ -0,0 +1,205 @@
+"""Cached PostgreSQL schema introspection for the SQL agent.
+
+The whole catalog (columns with types, primary keys, foreign keys and indexes) is read
+with a single query and kept per process. The hot path returns the cached copy without
+touching the database; every `SCHEMA_CACHE_CHECK_INTERVAL` seconds a cheap catalog probe
+compares the schema version, and DDL issued through the shared engine drops the cache
+immediately.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import xxhash
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between schema version probes; 0 probes on every lookup
+SCHEMA_CACHE_CHECK_INTERVAL = float(os.getenv("SCHEMA_CACHE_CHECK_INTERVAL", "60"))
+
+_USER_SCHEMAS = (
+    "n.nspname NOT IN ('pg_catalog', 'information_schema') "
+    "AND n.nspname NOT LIKE 'pg\\_toast%'"
+)
+
+SCHEMA_QUERY = text(
+    f"""
+    SELECT
+        n.nspname AS table_schema,
+        c.relname AS table_name,
+        (
+            SELECT json_object_agg(
+                a.attname, format_type(a.atttypid, a.atttypmod) ORDER BY a.attnum
+            )
+            FROM pg_attribute a
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        ) AS columns,
+        (
+            SELECT json_agg(a.attname ORDER BY k.ord)
+            FROM pg_constraint con
+            CROSS JOIN LATERAL unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a
+                ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            WHERE con.conrelid = c.oid AND con.contype = 'p'
+        ) AS primary_key,
+        (
+            SELECT json_agg(
+                json_build_object(
+                    'columns', (
+                        SELECT json_agg(a.attname ORDER BY k.ord)
+                        FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                        JOIN pg_attribute a
+                            ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                    ),
+                    'references', con.confrelid::regclass::text,
+                    'referenced_columns', (
+                        SELECT json_agg(a.attname ORDER BY k.ord)
+                        FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                        JOIN pg_attribute a
+                            ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                    )
+                )
+                ORDER BY con.conname
+            )
+            FROM pg_constraint con
+            WHERE con.conrelid = c.oid AND con.contype = 'f'
+        ) AS foreign_keys,
+        (
+            SELECT json_agg(pg_get_indexdef(ix.indexrelid) ORDER BY ix.indexrelid)
+            FROM pg_index ix
+            WHERE ix.indrelid = c.oid
+        ) AS indexes
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'p') AND {_USER_SCHEMAS}
+    ORDER BY n.nspname, c.relname
+    """
+)
+
+# Any DDL rewrites the affected pg_class / pg_attribute / pg_constraint rows, changing
+# their xmin
+SCHEMA_VERSION_QUERY = text(
+    f"""
+    SELECT md5(
+        coalesce((
+            SELECT string_agg(c.oid::text || ':' || c.xmin::text, ',' ORDER BY c.oid)
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'p', 'i') AND {_USER_SCHEMAS}
+        ), '')
+        || '|' ||
+        coalesce((
+            SELECT string_agg(
+                a.attrelid::text || '.' || a.attnum::text || ':' || a.xmin::text, ','
+                ORDER BY a.attrelid, a.attnum
+            )
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'p') AND a.attnum > 0 AND {_USER_SCHEMAS}
+        ), '')
+        || '|' ||
+        coalesce((
+            SELECT string_agg(
+                con.oid::text || ':' || con.xmin::text, ',' ORDER BY con.oid
+            )
+            FROM pg_constraint con JOIN pg_namespace n ON n.oid = con.connamespace
+            WHERE {_USER_SCHEMAS}
+        ), '')
+    )
+    """
+)
+
+_DDL_PATTERN = re.compile(
+    r"(CREATE|ALTER|DROP|TRUNCATE|COMMENT|RENAME)\b", re.IGNORECASE
+)
+# Whitespace and comments before the first keyword, e.g. "-- add column\nALTER TABLE
+# ..."
+_LEADING_COMMENTS = re.compile(r"(?:\s+|--[^\n]*|/\*.*?\*/)*", re.DOTALL)
+
+
+class SchemaCache:
+    """Process-wide cache of the database schema keyed by a catalog version."""
+
+    def __init__(
+        self, engine: Engine, check_interval: float = SCHEMA_CACHE_CHECK_INTERVAL
+    ):
+        self.engine = engine
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._schema: Optional[Dict[str, Dict[str, Any]]] = None
+        self._json: Optional[str] = None
+        self._version: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+        self._checked_at = 0.0
+        event.listen(engine, "after_cursor_execute", self._on_execute)
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable digest of the schema contents, identical across processes for the same
+        schema."""
+        with self._lock:
+            self._ensure_current()
+            return self._fingerprint
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            self._ensure_current()
+            return self._schema
+
+    def get_json(self) -> str:
+        """The cached schema, already serialized for the agent's `get_schema` tool."""
+        with self._lock:
+            self._ensure_current()
+            return self._json
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._schema = self._json = self._version = self._fingerprint = None
+
+    def _ensure_current(self) -> None:
+        now = time.monotonic()
+        if self._schema is not None and now - self._checked_at < self.check_interval:
+            return
+        with self.engine.connect() as conn:
+            version = conn.execute(SCHEMA_VERSION_QUERY).scalar()
+            if self._schema is None or version != self._version:
+                logger.info("Loading database schema")
+                self._load(conn)
+                self._version = version
+        self._checked_at = now
+
+    def _load(self, conn) -> None:
+        schema = {}
+        for row in conn.execute(SCHEMA_QUERY):
+            schema[f"{row.table_schema}.{row.table_name}"] = {
+                "columns": row.columns or {},
+                "primary_key": row.primary_key or [],
+                "foreign_keys": [
+                    {
+                        "columns": fk["columns"],
+                        "references": (
+                            f"{fk['references']}({', '.join(fk['referenced_columns'])})"
+                        ),
+                    }
+                    for fk in row.foreign_keys or []
+                ],
+                "indexes": row.indexes or [],
+            }
+        self._schema = schema
+        self._json = json.dumps(schema, indent=2)
+        self._fingerprint = xxhash.xxh64_hexdigest(self._json)
+
+    def _on_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        if _DDL_PATTERN.match(statement, _LEADING_COMMENTS.match(statement).end()):
+            logger.info("DDL executed; invalidating cached schema")
+            self.invalidate()
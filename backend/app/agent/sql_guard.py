@@ -0,0 +1,189 @@
+"""Pre-flight checks for SQL written by the agent.
+
+Before a statement runs, its plan is estimated with `EXPLAIN (FORMAT JSON)`. Statements
+whose estimated cost or row count exceeds the configured thresholds are either wrapped
+in a LIMIT (when that brings the cost back under the threshold) or rejected with a
+structured error the model can act on. Every agent statement also runs under a
+transaction-local `statement_timeout`.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from app.agent.query_cache import is_read_statement
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+AGENT_SQL_GUARD_ENABLED = os.getenv("AGENT_SQL_GUARD_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# "limit" wraps oversized statements in a LIMIT when possible, "reject" always refuses
+# them
+AGENT_SQL_GUARD_MODE = os.getenv("AGENT_SQL_GUARD_MODE", "limit").lower()
+AGENT_SQL_MAX_COST = float(os.getenv("AGENT_SQL_MAX_COST", "1000000"))
+AGENT_SQL_MAX_PLAN_ROWS = float(os.getenv("AGENT_SQL_MAX_PLAN_ROWS", "100000"))
+AGENT_SQL_AUTO_LIMIT = int(os.getenv("AGENT_SQL_AUTO_LIMIT", "1000"))
+AGENT_SQL_STATEMENT_TIMEOUT_MS = int(
+    os.getenv("AGENT_SQL_STATEMENT_TIMEOUT_MS", "15000")
+)
+
+_QUERY_CANCELED = "57014"
+
+
+class QueryRejected(Exception):
+    """A statement refused before or during execution, with details for the model."""
+
+    def __init__(self, reason: str, message: str, hint: str, **details: Any):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.hint = hint
+        self.details = details
+
+    def to_tool_output(self) -> str:
+        return json.dumps(
+            {
+                "error": "query_rejected",
+                "reason": self.reason,
+                "message": self.message,
+                **self.details,
+                "hint": self.hint,
+            }
+        )
+
+
+@dataclass(frozen=True)
+class PlanEstimate:
+    total_cost: float
+    plan_rows: float
+    node_type: str
+
+    def exceeds(self, max_cost: float, max_rows: float) -> bool:
+        return self.total_cost > max_cost or self.plan_rows > max_rows
+
+
+@dataclass(frozen=True)
+class GuardedQuery:
+    sql: str
+    estimate: Optional[PlanEstimate] = None
+    limit: Optional[int] = None
+
+
+def set_statement_timeout(
+    conn: Connection, timeout_ms: int = AGENT_SQL_STATEMENT_TIMEOUT_MS
+) -> None:
+    """Bound every statement in the current transaction on `conn` to `timeout_ms`."""
+    if timeout_ms > 0:
+        conn.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": f"{timeout_ms}ms"},
+        )
+
+
+def explain(conn: Connection, sql: str) -> PlanEstimate:
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    return PlanEstimate(
+        total_cost=root["Total Cost"],
+        plan_rows=root["Plan Rows"],
+        node_type=root["Node Type"],
+    )
+
+
+def _try_explain(conn: Connection, sql: str) -> Optional[PlanEstimate]:
+    """`explain` in a savepoint, or None when Postgres cannot explain the statement
+    (e.g. SHOW)."""
+    try:
+        with conn.begin_nested():
+            return explain(conn, sql)
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) == _QUERY_CANCELED:
+            raise
+        logger.info(
+            "Cannot EXPLAIN agent statement, running it under the statement "
+            f"timeout only: {e.orig}"
+        )
+        return None
+
+
+def guard_query(
+    conn: Connection,
+    sql: str,
+    max_cost: float = AGENT_SQL_MAX_COST,
+    max_rows: float = AGENT_SQL_MAX_PLAN_ROWS,
+    mode: str = AGENT_SQL_GUARD_MODE,
+    auto_limit: int = AGENT_SQL_AUTO_LIMIT,
+) -> GuardedQuery:
+    """Return the statement to run for `sql`, or raise QueryRejected if it is too
+    expensive."""
+    sql = sql.strip().rstrip(";").strip()
+    # Every statement is explained, whatever it starts with; only statements EXPLAIN
+    # refuses (utility commands) run unestimated, still under the statement timeout
+    estimate = _try_explain(conn, sql)
+    if estimate is None:
+        return GuardedQuery(sql=sql)
+    if not estimate.exceeds(max_cost, max_rows):
+        return GuardedQuery(sql=sql, estimate=estimate)
+
+    limits = {"max_cost": max_cost, "max_rows": max_rows}
+    if mode == "limit" and is_read_statement(sql):
+        # On separate lines so a trailing -- comment in `sql` cannot swallow the
+        # parenthesis
+        limited_sql = f"SELECT * FROM (\n{sql}\n) AS agent_query LIMIT {auto_limit}"
+        limited = explain(conn, limited_sql)
+        if not limited.exceeds(max_cost, max_rows):
+            logger.info(
+                f"Auto-limited agent query (estimated cost {estimate.total_cost:.0f}, "
+                f"rows {estimate.plan_rows:.0f})"
+            )
+            return GuardedQuery(sql=limited_sql, estimate=estimate, limit=auto_limit)
+
+    raise QueryRejected(
+        reason="estimated_cost_too_high"
+        if estimate.total_cost > max_cost
+        else "estimated_rows_too_high",
+        message=(
+            f"The planner estimates cost {estimate.total_cost:.0f} and "
+            f"{estimate.plan_rows:.0f} rows "
+            f"(top node: {estimate.node_type}), above the allowed limits."
+        ),
+        hint=(
+            "Add selective WHERE filters, join on key columns instead of producing a "
+            "cross product, aggregate with GROUP BY, or add a LIMIT."
+        ),
+        estimated_cost=estimate.total_cost,
+        estimated_rows=estimate.plan_rows,
+        limits=limits,
+    )
+
+
+def as_timeout_rejection(
+    error: DBAPIError, timeout_ms: int = AGENT_SQL_STATEMENT_TIMEOUT_MS
+) -> Optional[QueryRejected]:
+    """Translate a statement_timeout cancellation into a QueryRejected, if that is what
+    `error` is."""
+    if getattr(error.orig, "sqlstate", None) != _QUERY_CANCELED:
+        return None
+    return QueryRejected(
+        reason="statement_timeout",
+        message=(
+            "The query was cancelled after exceeding the "
+            f"{timeout_ms} ms statement timeout."
+        ),
+        hint=(
+            "Simplify the query: filter earlier, avoid unbounded scans and "
+            "cross joins, or aggregate."
+        ),
+        timeout_ms=timeout_ms,
+    )
@@ -1,6 +1,6 @@
 # Define agent state
 from dataclasses import dataclass, field
-from typing import Annotated, Dict, List, Optional, Sequence
+from typing import Annotated, Any, Dict, Optional, Sequence
 
 from copilotkit import CopilotKitState  # noqa: F401
 from langchain_core.messages import AnyMessage
@@ -20,7 +20,9 @@ class InputState:
     This class is used to define the initial state and structure of incoming data.
     """
 
-    messages: Annotated[Sequence[AnyMessage], add_messages] = field(default_factory=list)
+    messages: Annotated[Sequence[AnyMessage], add_messages] = field(
+        default_factory=list
+    )
     """
     Messages tracking the primary execution state of the agent.
 
@@ -66,4 +68,4 @@ class SQLAgentState(AgentState):
 
     last_query: Optional[str] = None
     query_attempts: int = 0
-    schema: Optional[Dict[str, List[str]]] = None
+    schema: Optional[Dict[str, Dict[str, Any]]] = None
@@ -1,9 +1,16 @@
+import hashlib
+import json
 import os
 import re
-from typing import List, Any, Dict
+import threading
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
 from IPython.display import Image, display
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -63,19 +70,118 @@ def print_stream(stream):
             message.pretty_print()
 
 
+# Chat model clients keyed by (provider, model name, kwargs, bound tools). A client owns
+# its HTTP session (boto3 / httpx), so reusing it also reuses pooled TLS connections
+# across agent steps; binding converts every tool to its JSON schema, so it is done once
+# per client as well. Tools are keyed by name and a digest of that schema, so a changed
+# tool gets a new client.
+_model_cache: Dict[Tuple[str, str, str, Tuple[Tuple[str, str], ...]], Any] = {}
+_model_cache_lock = threading.Lock()
+_model_cache_stats = {"hits": 0, "misses": 0, "build_seconds_total": 0.0}
+# Schema digests by tool object; converting a tool takes milliseconds, so it is not
+# redone on every step unless the tool's description or argument schema was replaced
+_tool_digests: Dict[int, Tuple[Any, Tuple[Any, ...], str]] = {}
+
+
+def _tool_digest(tool: Any) -> str:
+    version = (
+        getattr(tool, "description", None),
+        id(getattr(tool, "args_schema", None)),
+    )
+    cached = _tool_digests.get(id(tool))
+    if cached is not None and cached[0] is tool and cached[1] == version:
+        return cached[2]
+    schema = json.dumps(convert_to_openai_tool(tool), sort_keys=True, default=repr)
+    digest = hashlib.blake2b(schema.encode(), digest_size=8).hexdigest()
+    # Holding the tool keeps its id from being reused by another object
+    _tool_digests[id(tool)] = (tool, version, digest)
+    return digest
+
+
+def _model_key(
+    provider: str, model_name: str, model_kwargs: dict, tools: Sequence[Any]
+) -> Tuple[str, str, str, Tuple[Tuple[str, str], ...]]:
+    bound = tuple(
+        (getattr(tool, "name", repr(tool)), _tool_digest(tool)) for tool in tools
+    )
+    return (
+        provider,
+        model_name,
+        json.dumps(model_kwargs, sort_keys=True, default=repr),
+        bound,
+    )
+
+
 # def load_chat_model(fully_specified_name: str) -> BaseChatModel:
-def load_chat_model(model_name: str, model_kwargs: dict | None = None) -> Any:
+def load_chat_model(
+    model_name: str, model_kwargs: dict | None = None, tools: Sequence[Any] = ()
+) -> Any:
     """
-    Load a chat model based on MODEL_PROVIDER env var.
-    Supported providers: 'bedrock' and 'openai' (default).
+    Load a chat model based on MODEL_PROVIDER env var. Supported providers: 'bedrock'
+    (default), 'openai' and 'fake'. Any other value uses OpenAI.
 
-    - For 'bedrock' we attempt to import a Bedrock chat model from langchain.
-      If the Bedrock class is not available, raise with guidance.
+    - For 'bedrock' we attempt to import a Bedrock chat model from langchain. If the
+      Bedrock class is not available, raise with guidance.
     - For 'openai' we ensure OPENAI_API_KEY is set before constructing the client.
+    - 'fake' replays a scripted conversation (see app.agent.fake_llm) and needs no
+      network.
+
+    With `tools`, the returned model has them bound. Models are built once per
+    (provider, model, kwargs, tool schemas) and reused by later calls until
+    `clear_model_cache`.
     """
-    logger.info(f"Entering load_chat_model: {model_name}")
     model_kwargs = model_kwargs or {}
     provider = os.environ.get("MODEL_PROVIDER", "bedrock").lower()
+    with _model_cache_lock:
+        key = _model_key(provider, model_name, model_kwargs, tools)
+        model = _model_cache.get(key)
+        if model is None:
+            started = time.perf_counter()
+            model = _build_chat_model(provider, model_name, model_kwargs)
+            if tools:
+                model = model.bind_tools(list(tools))
+            elapsed = time.perf_counter() - started
+            _model_cache[key] = model
+            _model_cache_stats["misses"] += 1
+            _model_cache_stats["build_seconds_total"] += elapsed
+            logger.info(
+                f"Built {provider} chat model client for {model_name} in "
+                f"{elapsed * 1000:.1f} ms"
+            )
+        else:
+            _model_cache_stats["hits"] += 1
+    return model
+
+
+def model_cache_stats() -> Dict[str, Any]:
+    with _model_cache_lock:
+        return {
+            **_model_cache_stats,
+            "clients": [
+                f"{p}:{m}"
+                + (f" {k}" if k != "{}" else "")
+                + (f" tools={','.join(n for n, _ in t)}" if t else "")
+                for p, m, k, t in _model_cache
+            ],
+        }
+
+
+def clear_model_cache() -> int:
+    """Drop all cached clients (e.g. after rotating credentials); returns how many were
+    cached."""
+    with _model_cache_lock:
+        count = len(_model_cache)
+        _model_cache.clear()
+        return count
+
+
+def _build_chat_model(provider: str, model_name: str, model_kwargs: dict) -> Any:
+    logger.info(f"Entering _build_chat_model: {model_name}")
+    if provider == "fake":
+        from app.agent.fake_llm import FakeChatModel
+
+        return FakeChatModel.from_env()
+
     if provider == "bedrock":
         try:
             # Try the Bedrock chat model import; adjust import path if your langchain version differs
@@ -97,13 +203,15 @@ def load_chat_model(model_name: str, model_kwargs: dict | None = None) -> Any:
         aws_secret = os.environ.get("AWS_SECRET_ACCESS_KEY")
 
         if not (aws_key and aws_secret):
-            logger.warning("AWS credentials not set in environment; Bedrock client may fail.")
+            logger.warning(
+                "AWS credentials not set in environment; Bedrock client may fail."
+            )
         # Instantiate Bedrock model; adjust constructor args for your langchain version
         try:
             return ChatBedrockConverse(
                 model_id="anthropic.claude-3-5-sonnet-20240620-v1:0",
                 region_name=os.environ.get("AWS_REGION"),
-                temperature=0
+                temperature=0,
             )
         except TypeError:
             # Fallback: some LangChain versions use different param names
@@ -128,7 +236,9 @@ def load_chat_model(model_name: str, model_kwargs: dict | None = None) -> Any:
 
     # instantiate ChatOpenAI; param names may vary by langchain version
     try:
-        return ChatOpenAI(model_name=model_name, openai_api_key=openai_key, **model_kwargs)
+        return ChatOpenAI(
+            model_name=model_name, openai_api_key=openai_key, **model_kwargs
+        )
     except TypeError:
         # alternate constructor signature
         return ChatOpenAI(model=model_name, openai_api_key=openai_key, **model_kwargs)
@@ -0,0 +1,231 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.logger import get_logger, logging_stats
+
+logger = get_logger(__name__)
+
+from ..agent.answer_cache import answer_cache
+from ..agent.checkpointer import checkpointer_stats
+from ..agent.executor import db_executor
+from ..agent.graph import memory
+from ..agent.query_cache import query_cache
+from ..agent.utils import clear_model_cache, model_cache_stats
+from ..db.columnar import snapshot_store
+from ..db.database import pool_stats
+from ..db.index_advisor import advise, workload_recorder
+from ..db.slow_queries import slow_query_log
+from .cache import insights_cache
+from .responses import response_cache_stats
+
+router = APIRouter()
+
+
+@router.get("/admin/db/pool")
+async def get_pool_stats():
+    logger.info("Entering get_pool_stats")
+    try:
+        return {"status": "success", "data": pool_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/db/slow-queries")
+async def get_slow_queries(limit: int = 50):
+    """Statements slower than SLOW_QUERY_THRESHOLD_MS, slowest first, with sampled
+    plans."""
+    logger.info("Entering get_slow_queries")
+    try:
+        return {
+            "status": "success",
+            "stats": slow_query_log.stats(),
+            "data": slow_query_log.entries(limit),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/db/slow-queries")
+async def clear_slow_queries():
+    logger.info("Entering clear_slow_queries")
+    try:
+        return {"status": "success", "cleared": slow_query_log.clear()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/db/workload")
+async def get_workload():
+    """Read statements recorded since startup, grouped by shape, most total time
+    first."""
+    logger.info("Entering get_workload")
+    try:
+        return {
+            "status": "success",
+            "stats": workload_recorder.stats(),
+            "data": workload_recorder.entries(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/db/workload")
+async def clear_workload():
+    logger.info("Entering clear_workload")
+    try:
+        return {"status": "success", "cleared": workload_recorder.clear()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/db/index-advice")
+async def get_index_advice():
+    """Indexes suggested for the recorded workload, plus usage of the existing ones."""
+    logger.info("Entering get_index_advice")
+    try:
+        # EXPLAINs every recorded statement with its sample parameters (not returned) on
+        # the sync engine
+        return {
+            "status": "success",
+            "data": await asyncio.to_thread(
+                advise, workload_recorder.entries(parameters=True)
+            ),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/cache/insights")
+async def get_insights_cache_stats():
+    logger.info("Entering get_insights_cache_stats")
+    try:
+        return {
+            "status": "success",
+            "data": insights_cache.stats(),
+            "encoded_bodies": response_cache_stats(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/cache/insights")
+async def invalidate_insights_cache(endpoint: Optional[str] = None):
+    """Drop cached insights, either for one endpoint (e.g. `sales-overview`) or all of
+    them."""
+    logger.info(f"Entering invalidate_insights_cache: {endpoint or 'all'}")
+    try:
+        return {"status": "success", "invalidated": insights_cache.invalidate(endpoint)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/insights/snapshot")
+async def get_insights_snapshot_stats():
+    logger.info("Entering get_insights_snapshot_stats")
+    try:
+        return {"status": "success", "data": snapshot_store.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/admin/insights/snapshot/reload")
+async def reload_insights_snapshot():
+    """Reload the columnar snapshot from scratch, e.g. after deleting rows, and drop
+    cached insights."""
+    logger.info("Entering reload_insights_snapshot")
+    try:
+        rows = await asyncio.to_thread(snapshot_store.refresh, True)
+        insights_cache.invalidate()
+        return {"status": "success", "rows": rows, "data": snapshot_store.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/cache/agent-queries")
+async def get_agent_query_cache_stats():
+    logger.info("Entering get_agent_query_cache_stats")
+    try:
+        return {"status": "success", "data": query_cache.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/cache/agent-queries")
+async def clear_agent_query_cache():
+    logger.info("Entering clear_agent_query_cache")
+    try:
+        return {"status": "success", "invalidated": query_cache.invalidate()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/cache/agent-answers")
+async def get_agent_answer_cache_stats():
+    logger.info("Entering get_agent_answer_cache_stats")
+    try:
+        return {"status": "success", "data": answer_cache.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/cache/agent-answers")
+async def clear_agent_answer_cache():
+    logger.info("Entering clear_agent_answer_cache")
+    try:
+        return {"status": "success", "invalidated": answer_cache.invalidate()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/agent/executor")
+async def get_agent_executor_stats():
+    """Queue depth, worker usage and wait times of the agent's database executor."""
+    logger.info("Entering get_agent_executor_stats")
+    try:
+        return {"status": "success", "data": db_executor.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/agent/models")
+async def get_agent_model_stats():
+    """Cached chat model clients and how often a step had to build one."""
+    logger.info("Entering get_agent_model_stats")
+    try:
+        return {"status": "success", "data": model_cache_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/agent/models")
+async def clear_agent_models():
+    """Drop cached chat model clients so the next step rebuilds them, e.g. after
+    rotating credentials."""
+    logger.info("Entering clear_agent_models")
+    try:
+        return {"status": "success", "cleared": clear_model_cache()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/agent/checkpoints")
+async def get_checkpoint_stats():
+    """Conversation threads and checkpoint memory held by the agent's checkpointer."""
+    logger.info("Entering get_checkpoint_stats")
+    try:
+        return {"status": "success", "data": checkpointer_stats(memory)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/logging")
+async def get_logging_stats():
+    """Records waiting for the log writer thread and records dropped because the queue
+    was full."""
+    logger.info("Entering get_logging_stats")
+    try:
+        return {"status": "success", "data": logging_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.logger import get_logger
+from app.utils.cache import TTLCache
+from app.utils.encoding import dumps
+
+logger = get_logger(__name__)
+
+from ..db.database import AsyncSessionLocal
+
+# Cache settings. Per-endpoint TTLs use the endpoint path segment, e.g.
+# INSIGHTS_CACHE_TTLS="sales-overview=900,top-films=120"
+INSIGHTS_CACHE_TTL = float(os.getenv("INSIGHTS_CACHE_TTL", "300"))
+INSIGHTS_CACHE_STALE_TTL = float(os.getenv("INSIGHTS_CACHE_STALE_TTL", "600"))
+INSIGHTS_CACHE_MAX_BYTES = int(
+    os.getenv("INSIGHTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+INSIGHTS_CACHE_ENABLED = os.getenv("INSIGHTS_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+def _parse_ttls(raw: str) -> Dict[str, float]:
+    ttls = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        endpoint, _, seconds = item.partition("=")
+        ttls[endpoint.strip()] = float(seconds)
+    return ttls
+
+
+Loader = Callable[..., Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class InsightsResult:
+    """A computed panel and the digest of its content, used as the response ETag."""
+
+    data: Any
+    digest: str
+    size: int
+
+    @classmethod
+    def of(cls, data: Any) -> "InsightsResult":
+        encoded = dumps(data)
+        return cls(
+            data=data,
+            digest=hashlib.blake2b(encoded, digest_size=12).hexdigest(),
+            size=len(encoded),
+        )
+
+
+class InsightsCache:
+    """Result cache for the insights endpoints with stale-while-revalidate refresh.
+
+    Results are keyed by endpoint name and query parameters. A fresh hit is a dictionary
+    lookup; a stale hit is answered from memory while one background task recomputes the
+    value; concurrent misses for the same key share a single database round trip.
+
+    `invalidate` bumps a generation counter. A refresh that started before the bump
+    still finishes, but its result is not stored, and requests waiting on it load again.
+    """
+
+    def __init__(
+        self,
+        cache: TTLCache,
+        ttls: Optional[Dict[str, float]] = None,
+        enabled: bool = True,
+    ):
+        self.cache = cache
+        self.ttls = ttls or {}
+        self.enabled = enabled
+        self._inflight: Dict[Hashable, asyncio.Task[Any]] = {}
+        # Bumped by invalidate(): _epoch for every endpoint, _generations per endpoint
+        self._epoch = 0
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def key(
+        endpoint: str, params: Dict[str, Any]
+    ) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+        return endpoint, tuple(sorted(params.items()))
+
+    async def fetch(self, endpoint: str, loader: Loader, **params: Any) -> Any:
+        """Return the cached result for `endpoint`/`params`, computing it with `loader`
+        when needed.
+
+        `loader` is called as `loader(db, **params)` with a session of its own, so a
+        background refresh never borrows the session of the request that triggered it.
+        """
+        return (await self.fetch_result(endpoint, loader, **params)).data
+
+    async def fetch_result(
+        self, endpoint: str, loader: Loader, **params: Any
+    ) -> InsightsResult:
+        """Like `fetch`, but returns the result together with its content digest."""
+        if not self.enabled:
+            return InsightsResult.of(await self._load(loader, params))
+
+        key = self.key(endpoint, params)
+        entry = self.cache.get_entry(key)
+        if entry is not None:
+            if not entry.is_fresh and key not in self._inflight:
+                logger.debug(f"Serving stale {endpoint} and refreshing in background")
+                self._start(key, endpoint, loader, params)
+            return entry.value
+
+        while True:
+            generation = self._generation(endpoint)
+            task = self._inflight.get(key) or self._start(key, endpoint, loader, params)
+            result = await asyncio.shield(task)
+            if self._generation(endpoint) == generation:
+                return result
+            logger.debug(f"{endpoint} was invalidated while loading, loading again")
+
+    def invalidate(self, endpoint: Optional[str] = None) -> int:
+        """Drop cached results for one endpoint, or for every endpoint when omitted.
+
+        Refreshes already running are detached, so they cannot store results computed
+        before the invalidation, and the next request starts a new one.
+        """
+        if endpoint is None:
+            self._epoch += 1
+        else:
+            self._generations[endpoint] = self._generations.get(endpoint, 0) + 1
+        for key in [k for k in self._inflight if endpoint is None or k[0] == endpoint]:
+            del self._inflight[key]
+        return self.cache.invalidate(
+            None if endpoint is None else lambda key: key[0] == endpoint
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "enabled": self.enabled,
+            "refreshing": len(self._inflight),
+        }
+
+    def _start(
+        self, key: Hashable, endpoint: str, loader: Loader, params: Dict[str, Any]
+    ) -> "asyncio.Task[Any]":
+        task = asyncio.create_task(self._refresh(key, endpoint, loader, params))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    def _generation(self, endpoint: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(endpoint, 0)
+
+    def _finish(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        # A task detached by invalidate() may finish after its replacement started
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Already logged in _refresh; retrieving it keeps asyncio from reporting it
+            # again
+            task.exception()
+
+    async def _refresh(
+        self, key: Hashable, endpoint: str, loader: Loader, params: Dict[str, Any]
+    ) -> InsightsResult:
+        generation = self._generation(endpoint)
+        try:
+            result = InsightsResult.of(await self._load(loader, params))
+        except Exception as e:
+            logger.error(f"Error refreshing cached {endpoint}: {e}")
+            raise
+        if self._generation(endpoint) == generation:
+            self.cache.set(key, result, ttl=self.ttls.get(endpoint), size=result.size)
+        return result
+
+    @staticmethod
+    async def _load(loader: Loader, params: Dict[str, Any]) -> Any:
+        async with AsyncSessionLocal() as db:
+            return await loader(db, **params)
+
+
+insights_cache = InsightsCache(
+    TTLCache(
+        max_bytes=INSIGHTS_CACHE_MAX_BYTES,
+        default_ttl=INSIGHTS_CACHE_TTL,
+        stale_ttl=INSIGHTS_CACHE_STALE_TTL,
+    ),
+    ttls=_parse_ttls(os.getenv("INSIGHTS_CACHE_TTLS", "")),
+    enabled=INSIGHTS_CACHE_ENABLED,
+)
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import desc, distinct, func
-from sqlalchemy.orm import Session
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import Numeric, desc, distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.logger import get_logger
 
 logger = get_logger(__name__)
-from ..db.database import get_db
+from ..db.columnar import answers_from_snapshot
+from ..db.database import get_async_db
 from ..db.models import (
     Actor,
     Address,
@@ -16,14 +22,53 @@ from ..db.models import (
     Inventory,
     Payment,
     Rental,
+    SalesMonthlyRollup,
     Store,
 )
+from ..utils.encoding import (
+    ARROW_MEDIA_TYPE,
+    dumps,
+    records_to_arrow,
+    records_to_columnar,
+)
+from .cache import InsightsResult, insights_cache
+from .responses import conditional_response
 
 router = APIRouter()
 
+# Each panel is computed by a loader taking its own session, so results can be cached
+# and refreshed in the background independently of the request that asked for them. With
+# INSIGHTS_ENGINE=columnar the loaders answer from the in-memory snapshot
+# (app.db.columnar).
+
+# `format` on the panel routes: "json" (rows as objects), "columnar" (column arrays plus
+# a schema header, see app.utils.encoding) or "arrow" (an Arrow IPC stream)
+ResponseFormat = Literal["json", "columnar", "arrow"]
+
+
+def _encode(data: List[Dict[str, Any]], format: str) -> bytes:
+    # Encoded directly with orjson; skips FastAPI's per-value jsonable_encoder pass
+    if format == "arrow":
+        return records_to_arrow(data)
+    if format == "columnar":
+        data = records_to_columnar(data)
+    return dumps({"status": "success", "data": data})
+
+
+def _respond(request: Request, result: InsightsResult, format: str) -> Response:
+    # ETag from the result digest, 304 on If-None-Match, compressed body cached by
+    # digest
+    return conditional_response(
+        request,
+        result.digest,
+        format,
+        ARROW_MEDIA_TYPE if format == "arrow" else "application/json",
+        lambda: _encode(result.data, format),
+    )
+
 
 @router.get("/insights")
-async def get_insights(db: Session = Depends(get_db)):
+async def get_insights(db: AsyncSession = Depends(get_async_db)):
     logger.info("Entering get_insights")
     try:
         # TODO: Implement insights generation logic
@@ -32,250 +77,425 @@ async def get_insights(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("top_films")
+async def load_top_films(db: AsyncSession, limit: int = 10) -> List[Dict[str, Any]]:
+    # Get top films by rental count
+    stmt = (
+        select(
+            Film.title,
+            func.count(Rental.rental_id).label("rental_count"),
+            Film.rental_rate,
+            func.sum(Payment.amount).label("total_revenue"),
+        )
+        .join(Rental, Film.film_id == Rental.inventory_id)
+        .join(Payment, Rental.rental_id == Payment.rental_id)
+        .group_by(Film.film_id)
+        .order_by(desc("rental_count"))
+        .limit(limit)
+    )
+    top_films = (await db.execute(stmt)).all()
+    return [
+        {
+            "title": film.title,
+            "rental_count": film.rental_count,
+            "rental_rate": float(film.rental_rate),
+            "total_revenue": float(film.total_revenue),
+        }
+        for film in top_films
+    ]
+
+
 @router.get("/insights/top-films")
-async def get_top_films(limit: int = 10, db: Session = Depends(get_db)):
+async def get_top_films(
+    request: Request, limit: int = 10, format: ResponseFormat = "json"
+):
     logger.info("Entering get_top_films")
     try:
-        # Get top films by rental count
-        top_films = (
-            db.query(
-                Film.title,
-                func.count(Rental.rental_id).label("rental_count"),
-                Film.rental_rate,
-                func.sum(Payment.amount).label("total_revenue"),
-            )
-            .join(Rental, Film.film_id == Rental.inventory_id)
-            .join(Payment, Rental.rental_id == Payment.rental_id)
-            .group_by(Film.film_id)
-            .order_by(desc("rental_count"))
-            .limit(limit)
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result("top-films", load_top_films, limit=limit),
+            format,
         )
-
-        return {
-            "status": "success",
-            "data": [
-                {
-                    "title": film.title,
-                    "rental_count": film.rental_count,
-                    "rental_rate": float(film.rental_rate),
-                    "total_revenue": float(film.total_revenue),
-                }
-                for film in top_films
-            ],
-        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("category_performance")
+async def load_category_performance(db: AsyncSession) -> List[Dict[str, Any]]:
+    # Get performance metrics by category
+    stmt = (
+        select(
+            Category.name,
+            func.count(Film.film_id).label("film_count"),
+            func.avg(Film.rental_rate).label("avg_rental_rate"),
+            func.sum(Payment.amount).label("total_revenue"),
+        )
+        .join(Film, Category.category_id == Film.film_id)
+        .join(Rental, Film.film_id == Rental.inventory_id)
+        .join(Payment, Rental.rental_id == Payment.rental_id)
+        .group_by(Category.category_id)
+    )
+    category_stats = (await db.execute(stmt)).all()
+    return [
+        {
+            "category": cat.name,
+            "film_count": cat.film_count,
+            "avg_rental_rate": float(cat.avg_rental_rate),
+            "total_revenue": float(cat.total_revenue),
+        }
+        for cat in category_stats
+    ]
+
+
 @router.get("/insights/category-performance")
-async def get_category_performance(db: Session = Depends(get_db)):
+async def get_category_performance(request: Request, format: ResponseFormat = "json"):
     logger.info("Entering get_category_performance")
     try:
-        # Get performance metrics by category
-        category_stats = (
-            db.query(
-                Category.name,
-                func.count(Film.film_id).label("film_count"),
-                func.avg(Film.rental_rate).label("avg_rental_rate"),
-                func.sum(Payment.amount).label("total_revenue"),
-            )
-            .join(Film, Category.category_id == Film.film_id)
-            .join(Rental, Film.film_id == Rental.inventory_id)
-            .join(Payment, Rental.rental_id == Payment.rental_id)
-            .group_by(Category.category_id)
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result(
+                "category-performance", load_category_performance
+            ),
+            format,
         )
-
-        return {
-            "status": "success",
-            "data": [
-                {
-                    "category": cat.name,
-                    "film_count": cat.film_count,
-                    "avg_rental_rate": float(cat.avg_rental_rate),
-                    "total_revenue": float(cat.total_revenue),
-                }
-                for cat in category_stats
-            ],
-        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("customer_activity")
+async def load_customer_activity(
+    db: AsyncSession, limit: int = 10
+) -> List[Dict[str, Any]]:
+    # Get most active customers
+    stmt = (
+        select(
+            Customer.first_name,
+            Customer.last_name,
+            func.count(Rental.rental_id).label("rental_count"),
+            func.sum(Payment.amount).label("total_spent"),
+        )
+        .join(Rental, Customer.customer_id == Rental.customer_id)
+        .join(Payment, Rental.rental_id == Payment.rental_id)
+        .group_by(Customer.customer_id)
+        .order_by(desc("total_spent"))
+        .limit(limit)
+    )
+    active_customers = (await db.execute(stmt)).all()
+    return [
+        {
+            "customer_name": f"{cust.first_name} {cust.last_name}",
+            "rental_count": cust.rental_count,
+            "total_spent": float(cust.total_spent),
+        }
+        for cust in active_customers
+    ]
+
+
 @router.get("/insights/customer-activity")
-async def get_customer_activity(limit: int = 10, db: Session = Depends(get_db)):
+async def get_customer_activity(
+    request: Request, limit: int = 10, format: ResponseFormat = "json"
+):
     logger.info("Entering get_customer_activity")
     try:
-        # Get most active customers
-        active_customers = (
-            db.query(
-                Customer.first_name,
-                Customer.last_name,
-                func.count(Rental.rental_id).label("rental_count"),
-                func.sum(Payment.amount).label("total_spent"),
-            )
-            .join(Rental, Customer.customer_id == Rental.customer_id)
-            .join(Payment, Rental.rental_id == Payment.rental_id)
-            .group_by(Customer.customer_id)
-            .order_by(desc("total_spent"))
-            .limit(limit)
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result(
+                "customer-activity", load_customer_activity, limit=limit
+            ),
+            format,
         )
-
-        return {
-            "status": "success",
-            "data": [
-                {
-                    "customer_name": f"{cust.first_name} {cust.last_name}",
-                    "rental_count": cust.rental_count,
-                    "total_spent": float(cust.total_spent),
-                }
-                for cust in active_customers
-            ],
-        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("store_performance")
+async def load_store_performance(db: AsyncSession) -> List[Dict[str, Any]]:
+    # Get store performance metrics
+    stmt = (
+        select(
+            Store.store_id,
+            func.count(Rental.rental_id).label("rental_count"),
+            func.sum(Payment.amount).label("total_revenue"),
+            func.avg(Payment.amount).label("avg_transaction"),
+        )
+        .join(Rental, Store.store_id == Rental.staff_id)
+        .join(Payment, Rental.rental_id == Payment.rental_id)
+        .group_by(Store.store_id)
+    )
+    store_stats = (await db.execute(stmt)).all()
+    return [
+        {
+            "store_id": store.store_id,
+            "rental_count": store.rental_count,
+            "total_revenue": float(store.total_revenue),
+            "avg_transaction": float(store.avg_transaction),
+        }
+        for store in store_stats
+    ]
+
+
 @router.get("/insights/store-performance")
-async def get_store_performance(db: Session = Depends(get_db)):
+async def get_store_performance(request: Request, format: ResponseFormat = "json"):
     logger.info("Entering get_store_performance")
     try:
-        # Get store performance metrics
-        store_stats = (
-            db.query(
-                Store.store_id,
-                func.count(Rental.rental_id).label("rental_count"),
-                func.sum(Payment.amount).label("total_revenue"),
-                func.avg(Payment.amount).label("avg_transaction"),
-            )
-            .join(Rental, Store.store_id == Rental.staff_id)
-            .join(Payment, Rental.rental_id == Payment.rental_id)
-            .group_by(Store.store_id)
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result(
+                "store-performance", load_store_performance
+            ),
+            format,
         )
-
-        return {
-            "status": "success",
-            "data": [
-                {
-                    "store_id": store.store_id,
-                    "rental_count": store.rental_count,
-                    "total_revenue": float(store.total_revenue),
-                    "avg_transaction": float(store.avg_transaction),
-                }
-                for store in store_stats
-            ],
-        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("actor_popularity")
+async def load_actor_popularity(
+    db: AsyncSession, limit: int = 10
+) -> List[Dict[str, Any]]:
+    # Get most popular actors based on film rentals
+    stmt = (
+        select(
+            Actor.first_name,
+            Actor.last_name,
+            func.count(Rental.rental_id).label("rental_count"),
+            func.sum(Payment.amount).label("total_revenue"),
+        )
+        .join(Film, Actor.actor_id == Film.film_id)
+        .join(Rental, Film.film_id == Rental.inventory_id)
+        .join(Payment, Rental.rental_id == Payment.rental_id)
+        .group_by(Actor.actor_id)
+        .order_by(desc("rental_count"))
+        .limit(limit)
+    )
+    popular_actors = (await db.execute(stmt)).all()
+    return [
+        {
+            "actor_name": f"{actor.first_name} {actor.last_name}",
+            "rental_count": actor.rental_count,
+            "total_revenue": float(actor.total_revenue),
+        }
+        for actor in popular_actors
+    ]
+
+
 @router.get("/insights/actor-popularity")
-async def get_actor_popularity(limit: int = 10, db: Session = Depends(get_db)):
+async def get_actor_popularity(
+    request: Request, limit: int = 10, format: ResponseFormat = "json"
+):
     logger.info("Entering get_actor_popularity")
     try:
-        # Get most popular actors based on film rentals
-        popular_actors = (
-            db.query(
-                Actor.first_name,
-                Actor.last_name,
-                func.count(Rental.rental_id).label("rental_count"),
-                func.sum(Payment.amount).label("total_revenue"),
-            )
-            .join(Film, Actor.actor_id == Film.film_id)
-            .join(Rental, Film.film_id == Rental.inventory_id)
-            .join(Payment, Rental.rental_id == Payment.rental_id)
-            .group_by(Actor.actor_id)
-            .order_by(desc("rental_count"))
-            .limit(limit)
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result(
+                "actor-popularity", load_actor_popularity, limit=limit
+            ),
+            format,
         )
-
-        return {
-            "status": "success",
-            "data": [
-                {
-                    "actor_name": f"{actor.first_name} {actor.last_name}",
-                    "rental_count": actor.rental_count,
-                    "total_revenue": float(actor.total_revenue),
-                }
-                for actor in popular_actors
-            ],
-        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("sales_overview")
+async def load_sales_overview(db: AsyncSession) -> List[Dict[str, Any]]:
+    # Monthly figures come from the incrementally maintained rollup (see app.db.rollups)
+    stmt = select(SalesMonthlyRollup).order_by(SalesMonthlyRollup.month).limit(12)
+    months = (await db.execute(stmt)).scalars().all()
+    if not months:
+        # Rollup not built yet (fresh database); aggregate the payments directly
+        return await _aggregate_sales_overview(db)
+    return [
+        {
+            "date": month.month.strftime("%Y-%m"),
+            "Sales": float(month.sales),
+            "Profit": float(month.profit),
+            "Expenses": float(month.expenses),
+            "Customers": month.customers,
+        }
+        for month in months
+    ]
+
+
+async def _aggregate_sales_overview(db: AsyncSession) -> List[Dict[str, Any]]:
+    # group by a date_trunc('month', ...) expression and format it with to_char in the SELECT
+    date_trunc_month = func.date_trunc("month", Payment.payment_date)
+    # Get monthly sales data for the past year
+    stmt = (
+        select(
+            func.to_char(date_trunc_month, "YYYY-MM").label("date"),
+            func.sum(Payment.amount).label("Sales"),
+            # Typed as unscaled Numeric so the result is not rounded to amount's two
+            # decimals, matching the rollup
+            func.sum(Payment.amount * 0.7, type_=Numeric()).label(
+                "Profit"
+            ),  # Assuming 70% profit margin
+            func.sum(Payment.amount * 0.3, type_=Numeric()).label(
+                "Expenses"
+            ),  # Assuming 30% expenses
+            func.count(distinct(Rental.customer_id)).label("Customers"),
+        )
+        .join(Rental, Payment.rental_id == Rental.rental_id)
+        .group_by(date_trunc_month)
+        .order_by(date_trunc_month)
+        .limit(12)
+    )
+    sales_data = (await db.execute(stmt)).all()
+    return [
+        {
+            "date": sale.date,
+            "Sales": float(sale.Sales),
+            "Profit": float(sale.Profit),
+            "Expenses": float(sale.Expenses),
+            "Customers": sale.Customers,
+        }
+        for sale in sales_data
+    ]
+
+
 @router.get("/insights/sales-overview")
-async def get_sales_overview(db: Session = Depends(get_db)):
+async def get_sales_overview(request: Request, format: ResponseFormat = "json"):
     logger.info("Entering get_sales_overview")
     try:
-        # group by a date_trunc('month', ...) expression and format it with to_char in the SELECT
-        date_trunc_month = func.date_trunc('month', Payment.payment_date)
-        # Get monthly sales data for the past year
-        sales_data = (
-            db.query(
-                func.to_char(date_trunc_month, "YYYY-MM").label("date"),
-                func.sum(Payment.amount).label("Sales"),
-                func.sum(Payment.amount * 0.7).label("Profit"),  # Assuming 70% profit margin
-                func.sum(Payment.amount * 0.3).label("Expenses"),  # Assuming 30% expenses
-                func.count(distinct(Rental.customer_id)).label("Customers"),
-            )
-            .join(Rental, Payment.rental_id == Rental.rental_id)
-            .group_by(date_trunc_month)
-            .order_by(date_trunc_month)
-            .limit(12)
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result("sales-overview", load_sales_overview),
+            format,
         )
-
-        return {
-            "status": "success",
-            "data": [
-                {
-                    "date": sale.date,
-                    "Sales": float(sale.Sales),
-                    "Profit": float(sale.Profit),
-                    "Expenses": float(sale.Expenses),
-                    "Customers": sale.Customers,
-                }
-                for sale in sales_data
-            ],
-        }
     except Exception as e:
         logger.error(f"Error in get_sales_overview: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@answers_from_snapshot("regional_sales")
+async def load_regional_sales(db: AsyncSession) -> List[Dict[str, Any]]:
+    # Get sales data by country
+    stmt = (
+        select(
+            Country.country.label("region"),
+            func.sum(Payment.amount).label("sales"),
+            func.count(distinct(Rental.customer_id)).label("marketShare"),
+        )
+        .join(City, Country.country_id == City.country_id)
+        .join(Address, City.city_id == Address.city_id)
+        .join(Store, Address.address_id == Store.address_id)
+        .join(Inventory, Store.store_id == Inventory.store_id)
+        .join(Rental, Inventory.inventory_id == Rental.inventory_id)
+        .join(Payment, Rental.rental_id == Payment.rental_id)
+        .group_by(Country.country)
+        .order_by(func.sum(Payment.amount).desc())
+    )
+    regional_data = (await db.execute(stmt)).all()
+    return [
+        {
+            "region": region.region,
+            "sales": float(region.sales),
+            "marketShare": region.marketShare,
+        }
+        for region in regional_data
+    ]
+
+
 @router.get("/insights/regional-sales")
-async def get_regional_sales(db: Session = Depends(get_db)):
+async def get_regional_sales(request: Request, format: ResponseFormat = "json"):
     logger.info("Entering get_regional_sales")
     try:
-        # Get sales data by country
-        regional_data = (
-            db.query(
-                Country.country.label("region"),
-                func.sum(Payment.amount).label("sales"),
-                func.count(distinct(Rental.customer_id)).label("marketShare"),
-            )
-            .join(City, Country.country_id == City.country_id)
-            .join(Address, City.city_id == Address.city_id)
-            .join(Store, Address.address_id == Store.address_id)
-            .join(Inventory, Store.store_id == Inventory.store_id)
-            .join(Rental, Inventory.inventory_id == Rental.inventory_id)
-            .join(Payment, Rental.rental_id == Payment.rental_id)
-            .group_by(Country.country)
-            .order_by(func.sum(Payment.amount).desc())
-            .all()
+        return _respond(
+            request,
+            await insights_cache.fetch_result("regional-sales", load_regional_sales),
+            format,
         )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {
-            "status": "success",
-            "data": [
-                {"region": region.region, "sales": float(region.sales), "marketShare": region.marketShare}
-                for region in regional_data
-            ],
-        }
+
+# Panels available to the batched dashboard endpoint, keyed by the name of their own
+# route
+PANELS = {
+    "sales-overview": load_sales_overview,
+    "top-films": load_top_films,
+    "category-performance": load_category_performance,
+    "regional-sales": load_regional_sales,
+    "customer-activity": load_customer_activity,
+    "store-performance": load_store_performance,
+    "actor-popularity": load_actor_popularity,
+}
+DEFAULT_DASHBOARD_PANELS = [
+    "sales-overview",
+    "top-films",
+    "category-performance",
+    "regional-sales",
+    "customer-activity",
+]
+LIMITED_PANELS = {"top-films", "customer-activity", "actor-popularity"}
+
+
+@router.get("/insights/dashboard")
+async def get_dashboard(
+    request: Request,
+    panels: Optional[str] = None,
+    limit: int = 10,
+    format: Literal["json", "columnar"] = "json",
+):
+    """Compute several panels concurrently, each on its own connection, in one response.
+
+    `panels` is a comma-separated list of panel names (defaults to the panels shown on
+    the dashboard page). A failing panel is reported under `errors` without failing the
+    others. With `format=columnar` each panel is sent as column arrays plus a schema
+    header.
+    """
+    logger.info(f"Entering get_dashboard: {panels or 'default panels'}")
+    names = (
+        [name.strip() for name in panels.split(",") if name.strip()]
+        if panels
+        else DEFAULT_DASHBOARD_PANELS
+    )
+    unknown = [name for name in names if name not in PANELS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown panels: {', '.join(unknown)}"
+        )
+
+    try:
+        results = await asyncio.gather(
+            *(
+                insights_cache.fetch_result(
+                    name,
+                    PANELS[name],
+                    **({"limit": limit} if name in LIMITED_PANELS else {}),
+                )
+                for name in names
+            ),
+            return_exceptions=True,
+        )
+        data, errors = {}, {}
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error computing dashboard panel {name}: {result}")
+                errors[name] = str(result)
+            else:
+                data[name] = result
+
+        def encode() -> bytes:
+            panels = {
+                name: records_to_columnar(r.data) if format == "columnar" else r.data
+                for name, r in data.items()
+            }
+            return dumps({"status": "success", "data": panels, "errors": errors})
+
+        if errors:
+            # Partial results are not cached or tagged; the next load retries the failed
+            # panels
+            return Response(encode(), media_type="application/json")
+        digest = hashlib.blake2b(
+            ",".join(f"{name}={r.digest}" for name, r in data.items()).encode(),
+            digest_size=12,
+        )
+        return conditional_response(
+            request,
+            digest.hexdigest(),
+            f"dashboard-{format}",
+            "application/json",
+            encode,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
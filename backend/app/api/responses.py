@@ -0,0 +1,113 @@
+"""Conditional and compressed responses for the insights endpoints.
+
+Each response carries a strong ETag built from the content digest of the cached result
+(`InsightsResult.digest`), the wire format and the content coding, so a client sending
+it back in `If-None-Match` gets a 304 without anything being encoded. Bodies of at least
+`INSIGHTS_COMPRESSION_MIN_BYTES` are compressed with zstd or gzip, whichever the client
+prefers in `Accept-Encoding`, and encoded bodies are kept by digest so repeat requests
+for unchanged data are a lookup.
+"""
+
+import gzip
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import zstandard
+from fastapi import Request, Response
+
+from app.utils.cache import TTLCache
+
+INSIGHTS_COMPRESSION_MIN_BYTES = int(
+    os.getenv("INSIGHTS_COMPRESSION_MIN_BYTES", "1024")
+)
+INSIGHTS_GZIP_LEVEL = int(os.getenv("INSIGHTS_GZIP_LEVEL", "6"))
+INSIGHTS_ZSTD_LEVEL = int(os.getenv("INSIGHTS_ZSTD_LEVEL", "3"))
+INSIGHTS_RESPONSE_CACHE_MAX_BYTES = int(
+    os.getenv("INSIGHTS_RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+)
+
+# Content codings we produce, in server preference order for equal client q-values
+_CODINGS = {
+    "zstd": lambda body: zstandard.ZstdCompressor(level=INSIGHTS_ZSTD_LEVEL).compress(
+        body
+    ),
+    "gzip": lambda body: gzip.compress(
+        body, compresslevel=INSIGHTS_GZIP_LEVEL, mtime=0
+    ),
+}
+_ETAG_SUFFIX = {"zstd": "-zst", "gzip": "-gz"}
+
+# Encoded bodies keyed by (digest, variant, coding). A new result has a new digest, so
+# entries never go stale; the TTL only bounds how long unused bodies linger
+encoded_bodies = TTLCache(max_bytes=INSIGHTS_RESPONSE_CACHE_MAX_BYTES, default_ttl=3600)
+
+
+def negotiate_coding(accept_encoding: str) -> Optional[str]:
+    """The content coding to use for `Accept-Encoding`, or None for identity."""
+    weights = {}
+    for item in filter(
+        None, (part.strip() for part in accept_encoding.lower().split(","))
+    ):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = [
+        (weights.get(coding, wildcard), -rank, coding)
+        for rank, coding in enumerate(_CODINGS)
+    ]
+    q, _, coding = max(candidates)
+    return coding if q > 0 else None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+def conditional_response(
+    request: Request,
+    digest: str,
+    variant: str,
+    media_type: str,
+    encode: Callable[[], bytes],
+) -> Response:
+    """Answer with a 304, or with the body from `encode()` compressed as negotiated.
+
+    `variant` names the representation of the data (e.g. the `format` parameter) and is
+    part of both the ETag and the body cache key; `encode` only runs on a body-cache
+    miss.
+    """
+    coding = negotiate_coding(request.headers.get("accept-encoding", ""))
+    etag = f'"{digest}-{variant}{_ETAG_SUFFIX.get(coding, "")}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (digest, variant, coding)
+    cached: Optional[Tuple[bytes, Optional[str]]] = encoded_bodies.get(key)
+    if cached is None:
+        body = encode()
+        # Small bodies go out uncompressed; the outcome is deterministic, so the ETag
+        # still holds
+        applied = (
+            coding if coding and len(body) >= INSIGHTS_COMPRESSION_MIN_BYTES else None
+        )
+        cached = (_CODINGS[applied](body) if applied else body, applied)
+        encoded_bodies.set(key, cached, size=len(cached[0]))
+    body, applied = cached
+    if applied:
+        headers["Content-Encoding"] = applied
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    return encoded_bodies.stats()
@@ -0,0 +1,588 @@
+"""In-memory columnar snapshot of the insights tables (`INSIGHTS_ENGINE=columnar`).
+
+`payment`, `rental`, `inventory` and the dimension tables the insights panels read are
+held as NumPy arrays, sorted by primary key. Money is stored in integer cents, so sums
+are exact, and `payment_date` as a month number. Every
+`INSIGHTS_SNAPSHOT_REFRESH_INTERVAL` seconds rows whose `last_update` is newer than the
+table's watermark minus `INSIGHTS_SNAPSHOT_WATERMARK_OVERLAP` seconds are read, and the
+ones that are new or changed are merged in; the overlap catches rows committed after the
+previous refresh with an older `last_update`. A full reload every
+`INSIGHTS_SNAPSHOT_REBUILD_INTERVAL` seconds also drops deleted rows. Each refresh
+builds a new `Snapshot` and swaps it in, so readers always see one consistent version.
+
+The panels are computed with vectorized group-bys over the `payment ⨝ rental` fact
+columns and return the same rows as the SQL in `app/api/insights.py`, joins included.
+Until the first load finishes, or when it fails, the insights endpoints keep using SQL.
+Check that every panel still matches its SQL loader with:
+
+    python -m app.db.columnar --check
+"""
+
+import argparse
+import asyncio
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.logger import get_logger
+
+from .database import get_engine
+
+logger = get_logger(__name__)
+
+# "sql" answers the insights endpoints from Postgres, "columnar" from the in-memory
+# snapshot
+INSIGHTS_ENGINE = os.getenv("INSIGHTS_ENGINE", "sql").lower()
+INSIGHTS_SNAPSHOT_REFRESH_INTERVAL = float(
+    os.getenv("INSIGHTS_SNAPSHOT_REFRESH_INTERVAL", "60")
+)
+# Seconds between full reloads, which also pick up deleted rows; 0 disables them
+INSIGHTS_SNAPSHOT_REBUILD_INTERVAL = float(
+    os.getenv("INSIGHTS_SNAPSHOT_REBUILD_INTERVAL", "3600")
+)
+# Seconds before each table's watermark that a refresh reads again, for late-committed
+# rows
+INSIGHTS_SNAPSHOT_WATERMARK_OVERLAP = float(
+    os.getenv("INSIGHTS_SNAPSHOT_WATERMARK_OVERLAP", "300")
+)
+_FETCH_ROWS = 50000
+_NULL_ID = -1
+
+# Table -> (primary key, {column: kind}). Kinds: "id" (int64, NULL -> -1), "cents"
+# (int64), "month" (int32 months since 1970-01) and "text" (object).
+TABLES: Dict[str, Tuple[str, Dict[str, str]]] = {
+    "payment": (
+        "payment_id",
+        {"rental_id": "id", "amount": "cents", "payment_date": "month"},
+    ),
+    "rental": (
+        "rental_id",
+        {"inventory_id": "id", "customer_id": "id", "staff_id": "id"},
+    ),
+    "inventory": ("inventory_id", {"store_id": "id"}),
+    "film": ("film_id", {"title": "text", "rental_rate": "cents"}),
+    "category": ("category_id", {"name": "text"}),
+    "actor": ("actor_id", {"first_name": "text", "last_name": "text"}),
+    "customer": ("customer_id", {"first_name": "text", "last_name": "text"}),
+    "store": ("store_id", {"address_id": "id"}),
+    "address": ("address_id", {"city_id": "id"}),
+    "city": ("city_id", {"country_id": "id"}),
+    "country": ("country_id", {"country": "text"}),
+}
+
+
+def _month(value: Optional[datetime]) -> int:
+    return _NULL_ID if value is None else (value.year - 1970) * 12 + value.month - 1
+
+
+def _to_array(values: List[Any], kind: str) -> np.ndarray:
+    if kind == "id":
+        return np.array([_NULL_ID if v is None else v for v in values], dtype=np.int64)
+    if kind == "cents":
+        return np.array([round(v * 100) for v in values], dtype=np.int64)
+    if kind == "month":
+        return np.array([_month(v) for v in values], dtype=np.int32)
+    return np.array(values, dtype=object)
+
+
+@dataclass
+class Table:
+    """Columns of one table as arrays sorted by `key`, plus the newest `last_update`
+    seen."""
+
+    key: np.ndarray
+    columns: Dict[str, np.ndarray]
+    watermark: Optional[datetime]
+
+    def __len__(self) -> int:
+        return len(self.key)
+
+    @property
+    def nbytes(self) -> int:
+        # Object (text) columns only count their pointers
+        return self.key.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def lookup(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions of `ids` and a mask of the ids that exist (the inner-join
+        rows)."""
+        if not len(self.key):
+            return np.zeros(len(ids), dtype=np.intp), np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.key, ids), len(self.key) - 1)
+        return positions, self.key[positions] == ids
+
+    def changed_rows(self, loaded: "Table") -> "Table":
+        """The rows of `loaded` that are new or differ from these rows."""
+        if not len(loaded) or not len(self):
+            return loaded
+        positions, same = self.lookup(loaded.key)
+        for name, values in self.columns.items():
+            same &= values[positions] == loaded.columns[name]
+        keep = ~same
+        return Table(
+            loaded.key[keep],
+            {name: v[keep] for name, v in loaded.columns.items()},
+            loaded.watermark,
+        )
+
+    def merge(self, changed: "Table") -> "Table":
+        """A new table with `changed` rows replacing or added to these rows."""
+        if not len(changed):
+            return self
+        positions, found = self.lookup(changed.key)
+        columns = {}
+        for name, values in self.columns.items():
+            merged = values.copy()
+            merged[positions[found]] = changed.columns[name][found]
+            columns[name] = np.concatenate([merged, changed.columns[name][~found]])
+        key = np.concatenate([self.key, changed.key[~found]])
+        order = np.argsort(key, kind="stable")
+        watermark = max(filter(None, [self.watermark, changed.watermark]), default=None)
+        return Table(
+            key[order],
+            {name: values[order] for name, values in columns.items()},
+            watermark,
+        )
+
+
+def _load_table(conn, name: str, since: Optional[datetime]) -> Table:
+    key, kinds = TABLES[name]
+    columns = [key, *kinds]
+    stmt = f"SELECT {', '.join(columns)}, last_update FROM {name}"
+    params = {}
+    if since is not None:
+        stmt += " WHERE last_update > :since"
+        params["since"] = since - timedelta(seconds=INSIGHTS_SNAPSHOT_WATERMARK_OVERLAP)
+    rows: List[Tuple[Any, ...]] = []
+    result = conn.execution_options(stream_results=True, yield_per=_FETCH_ROWS).execute(
+        text(stmt), params
+    )
+    for chunk in result.partitions():
+        rows.extend(chunk)
+    values = list(zip(*rows)) if rows else [()] * (len(columns) + 1)
+    keys = np.array(values[0], dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    arrays = {
+        column: _to_array(list(values[i + 1]), kind)[order]
+        for i, (column, kind) in enumerate(kinds.items())
+    }
+    watermark = max(filter(None, values[-1]), default=since)
+    return Table(keys[order], arrays, watermark)
+
+
+class Snapshot:
+    """One consistent version of the tables and the fact columns derived from them."""
+
+    def __init__(self, tables: Dict[str, Table], version: int):
+        self.tables = tables
+        self.version = version
+        payment, rental = tables["payment"], tables["rental"]
+        # payment JOIN rental ON payment.rental_id = rental.rental_id, the base of every
+        # panel
+        positions, found = rental.lookup(payment.columns["rental_id"])
+        positions = positions[found]
+        self.amount = payment.columns["amount"][found]
+        self.month = payment.columns["payment_date"][found]
+        self.inventory_id = rental.columns["inventory_id"][positions]
+        self.customer_id = rental.columns["customer_id"][positions]
+        self.staff_id = rental.columns["staff_id"][positions]
+
+    @staticmethod
+    def _group(
+        keys: np.ndarray, mask: np.ndarray, *weights: np.ndarray
+    ) -> Tuple[np.ndarray, ...]:
+        """Distinct `keys[mask]`, the row count per key and the per-key sums of each
+        weight."""
+        groups, inverse = np.unique(keys[mask], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(groups))
+        sums = [
+            np.bincount(inverse, weights=w[mask], minlength=len(groups))
+            .round()
+            .astype(np.int64)
+            for w in weights
+        ]
+        return (groups, counts, *sums)
+
+    @staticmethod
+    def _distinct_per_group(
+        inverse: np.ndarray, values: np.ndarray, groups: int
+    ) -> np.ndarray:
+        # One int64 key per (group, value) pair; 1-D np.unique is far faster than axis=1
+        span = int(values.max()) + 2 if len(values) else 1
+        pairs = np.unique(inverse.astype(np.int64) * span + values + 1)
+        return np.bincount(pairs // span, minlength=groups)
+
+    @staticmethod
+    def _top(counts: np.ndarray, groups: np.ndarray, limit: int) -> np.ndarray:
+        # Largest first; ties in key order, so results are stable across calls
+        return np.lexsort((groups, -counts))[:limit]
+
+    def top_films(self, limit: int = 10) -> List[Dict[str, Any]]:
+        film = self.tables["film"]
+        _, found = film.lookup(self.inventory_id)
+        films, counts, revenue = self._group(self.inventory_id, found, self.amount)
+        rows, _ = film.lookup(films)
+        return [
+            {
+                "title": film.columns["title"][rows[i]],
+                "rental_count": int(counts[i]),
+                "rental_rate": int(film.columns["rental_rate"][rows[i]]) / 100,
+                "total_revenue": int(revenue[i]) / 100,
+            }
+            for i in self._top(counts, films, limit)
+        ]
+
+    def category_performance(self) -> List[Dict[str, Any]]:
+        film, category = self.tables["film"], self.tables["category"]
+        film_rows, is_film = film.lookup(self.inventory_id)
+        _, is_category = category.lookup(self.inventory_id)
+        rates = film.columns["rental_rate"][film_rows]
+        categories, counts, revenue, rate_sum = self._group(
+            self.inventory_id, is_film & is_category, self.amount, rates
+        )
+        rows, _ = category.lookup(categories)
+        return [
+            {
+                "category": category.columns["name"][rows[i]],
+                "film_count": int(counts[i]),
+                "avg_rental_rate": int(rate_sum[i]) / int(counts[i]) / 100,
+                "total_revenue": int(revenue[i]) / 100,
+            }
+            for i in range(len(categories))
+        ]
+
+    def customer_activity(self, limit: int = 10) -> List[Dict[str, Any]]:
+        customer = self.tables["customer"]
+        _, found = customer.lookup(self.customer_id)
+        customers, counts, spent = self._group(self.customer_id, found, self.amount)
+        rows, _ = customer.lookup(customers)
+        return [
+            {
+                "customer_name": (
+                    f"{customer.columns['first_name'][rows[i]]} "
+                    f"{customer.columns['last_name'][rows[i]]}"
+                ),
+                "rental_count": int(counts[i]),
+                "total_spent": int(spent[i]) / 100,
+            }
+            for i in self._top(spent, customers, limit)
+        ]
+
+    def store_performance(self) -> List[Dict[str, Any]]:
+        # Same join as the SQL panel: store.store_id = rental.staff_id
+        _, found = self.tables["store"].lookup(self.staff_id)
+        stores, counts, revenue = self._group(self.staff_id, found, self.amount)
+        return [
+            {
+                "store_id": int(stores[i]),
+                "rental_count": int(counts[i]),
+                "total_revenue": int(revenue[i]) / 100,
+                "avg_transaction": int(revenue[i]) / int(counts[i]) / 100,
+            }
+            for i in range(len(stores))
+        ]
+
+    def actor_popularity(self, limit: int = 10) -> List[Dict[str, Any]]:
+        actor = self.tables["actor"]
+        _, is_film = self.tables["film"].lookup(self.inventory_id)
+        _, is_actor = actor.lookup(self.inventory_id)
+        actors, counts, revenue = self._group(
+            self.inventory_id, is_film & is_actor, self.amount
+        )
+        rows, _ = actor.lookup(actors)
+        return [
+            {
+                "actor_name": (
+                    f"{actor.columns['first_name'][rows[i]]} "
+                    f"{actor.columns['last_name'][rows[i]]}"
+                ),
+                "rental_count": int(counts[i]),
+                "total_revenue": int(revenue[i]) / 100,
+            }
+            for i in self._top(counts, actors, limit)
+        ]
+
+    def sales_overview(self) -> List[Dict[str, Any]]:
+        mask = self.month != _NULL_ID
+        months, inverse = np.unique(self.month[mask], return_inverse=True)
+        sales = (
+            np.bincount(inverse, weights=self.amount[mask], minlength=len(months))
+            .round()
+            .astype(np.int64)
+        )
+        customers = self._distinct_per_group(
+            inverse, self.customer_id[mask], len(months)
+        )
+        return [
+            {
+                "date": (
+                    f"{1970 + int(months[i]) // 12:04d}-{int(months[i]) % 12 + 1:02d}"
+                ),
+                "Sales": int(sales[i]) / 100,
+                # 70% profit and 30% expenses, unrounded like the rollup
+                "Profit": int(sales[i]) * 7 / 1000,
+                "Expenses": int(sales[i]) * 3 / 1000,
+                "Customers": int(customers[i]),
+            }
+            for i in range(min(12, len(months)))
+        ]
+
+    def regional_sales(self) -> List[Dict[str, Any]]:
+        # country ⨝ city ⨝ address ⨝ store ⨝ inventory ⨝ rental ⨝ payment, grouped by
+        # country name
+        ids, mask = self.inventory_id, np.ones(len(self.inventory_id), dtype=bool)
+        for table, column in (
+            ("inventory", "store_id"),
+            ("store", "address_id"),
+            ("address", "city_id"),
+            ("city", "country_id"),
+        ):
+            positions, found = self.tables[table].lookup(ids)
+            ids, mask = self.tables[table].columns[column][positions], mask & found
+        country = self.tables["country"]
+        positions, found = country.lookup(ids)
+        mask &= found
+        # Number the (few) country names once, then group the fact rows by that integer
+        names, name_ids = np.unique(
+            country.columns["country"].astype(str), return_inverse=True
+        )
+        inverse = name_ids[positions[mask]]
+        sales = (
+            np.bincount(inverse, weights=self.amount[mask], minlength=len(names))
+            .round()
+            .astype(np.int64)
+        )
+        customers = self._distinct_per_group(
+            inverse, self.customer_id[mask], len(names)
+        )
+        return [
+            {
+                "region": str(names[i]),
+                "sales": int(sales[i]) / 100,
+                "marketShare": int(customers[i]),
+            }
+            for i in np.lexsort((names, -sales))
+            if customers[i]
+        ]
+
+
+class SnapshotStore:
+    """Holds the current snapshot and refreshes it from the database."""
+
+    def __init__(self):
+        self.snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+        self._refresh_seconds = 0.0
+        self._refreshes = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def refresh(self, rebuild: bool = False) -> int:
+        """Merge rows changed since the last refresh (all rows when `rebuild`); returns
+        rows merged."""
+        with self._lock:
+            started = time.perf_counter()
+            current = self.snapshot
+            full = rebuild or current is None
+            with get_engine().connect() as conn:
+                conn = conn.execution_options(skip_slow_query_log=True)
+                changed = {
+                    name: _load_table(
+                        conn, name, None if full else current.tables[name].watermark
+                    )
+                    for name in TABLES
+                }
+            if not full:
+                # Rows read again because of the overlap are usually unchanged
+                changed = {
+                    name: current.tables[name].changed_rows(changed[name])
+                    for name in TABLES
+                }
+            rows = sum(len(t) for t in changed.values())
+            if full or rows:
+                tables = (
+                    changed
+                    if full
+                    else {
+                        name: current.tables[name].merge(changed[name])
+                        for name in TABLES
+                    }
+                )
+                self.snapshot = Snapshot(
+                    tables, version=(current.version + 1) if current else 1
+                )
+            self._refresh_seconds = time.perf_counter() - started
+            self._refreshes += 1
+            self._refreshed_at = time.time()
+            if full:
+                self._loaded_at = self._refreshed_at
+            logger.info(
+                f"Insights snapshot {'loaded' if full else 'refreshed'}: {rows} row(s) "
+                f"changed in {self._refresh_seconds:.2f}s"
+            )
+            return rows
+
+    async def query(self, panel: str, **params: Any) -> Any:
+        """Compute `panel` (a `Snapshot` method name) on a worker thread."""
+        return await asyncio.to_thread(getattr(self.snapshot, panel), **params)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "engine": INSIGHTS_ENGINE,
+            "ready": snapshot is not None,
+            "version": snapshot.version if snapshot else 0,
+            "rows": {name: len(t) for name, t in snapshot.tables.items()}
+            if snapshot
+            else {},
+            "bytes": sum(t.nbytes for t in snapshot.tables.values()) if snapshot else 0,
+            "refreshes": self._refreshes,
+            "last_refresh_seconds": round(self._refresh_seconds, 3),
+            "loaded_at": self._loaded_at,
+            "refreshed_at": self._refreshed_at,
+        }
+
+
+snapshot_store = SnapshotStore()
+
+
+def answers_from_snapshot(panel: str):
+    """Serve a `load_*(db, **params)` insights loader from the snapshot once it is
+    loaded."""
+
+    def decorate(loader: Callable[..., Awaitable[Any]]):
+        @functools.wraps(loader)
+        async def wrapper(db, **params):
+            if INSIGHTS_ENGINE == "columnar" and snapshot_store.ready:
+                return await snapshot_store.query(panel, **params)
+            return await loader(db, **params)
+
+        return wrapper
+
+    return decorate
+
+
+async def run_snapshot_refresher(
+    interval: float = INSIGHTS_SNAPSHOT_REFRESH_INTERVAL,
+    rebuild_interval: float = INSIGHTS_SNAPSHOT_REBUILD_INTERVAL,
+    on_refresh: Optional[Callable[[], Any]] = None,
+) -> None:
+    """Load the snapshot, then refresh it every `interval` seconds until cancelled.
+
+    `on_refresh` is called whenever a refresh changed the snapshot, e.g. to drop cached
+    responses.
+    """
+    last_rebuild = 0.0
+    while True:
+        try:
+            rebuild = not snapshot_store.ready or (
+                rebuild_interval > 0
+                and time.monotonic() - last_rebuild >= rebuild_interval
+            )
+            rows = await asyncio.to_thread(snapshot_store.refresh, rebuild)
+            if rebuild:
+                last_rebuild = time.monotonic()
+            if (rows or rebuild) and on_refresh is not None:
+                on_refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error refreshing insights snapshot: {e}")
+        await asyncio.sleep(interval)
+
+
+# Snapshot panel -> SQL loader name in app.api.insights; the ranked panels also take
+# `limit`
+PARITY_PANELS = {
+    "top_films": "load_top_films",
+    "category_performance": "load_category_performance",
+    "customer_activity": "load_customer_activity",
+    "store_performance": "load_store_performance",
+    "actor_popularity": "load_actor_popularity",
+    "sales_overview": "load_sales_overview",
+    "regional_sales": "load_regional_sales",
+}
+# Top-N panels, which take `limit`; their name columns are not compared because SQL may
+# order ties differently
+_RANKED_PANELS = {"top_films", "customer_activity", "actor_popularity"}
+_TIE_COLUMNS = {"title", "customer_name", "actor_name"}
+
+
+def _values_match(expected: Any, actual: Any) -> bool:
+    if isinstance(expected, float) or isinstance(actual, float):
+        # Averages and the rollup's float-derived sums differ in the last bits
+        return math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6)
+    return expected == actual
+
+
+def _rows_match(
+    panel: str, expected: List[Dict[str, Any]], actual: List[Dict[str, Any]]
+) -> bool:
+    if panel in ("category_performance", "store_performance", "regional_sales"):
+        # Unordered (or ordered only by a value that may tie) in SQL; compare by group
+        expected = sorted(expected, key=lambda row: str(next(iter(row.values()))))
+        actual = sorted(actual, key=lambda row: str(next(iter(row.values()))))
+    ranked = panel in _RANKED_PANELS
+    return len(expected) == len(actual) and all(
+        e.keys() == a.keys()
+        and all(
+            _values_match(e[k], a[k]) for k in e if not (ranked and k in _TIE_COLUMNS)
+        )
+        for e, a in zip(expected, actual)
+    )
+
+
+async def check_parity(limit: int = 10) -> Dict[str, bool]:
+    """Compare every snapshot panel with its SQL loader; True per panel when the rows
+    match."""
+    from app.api import insights
+
+    from .database import AsyncSessionLocal
+
+    if not snapshot_store.ready:
+        await asyncio.to_thread(snapshot_store.refresh, True)
+    results = {}
+    for panel, loader_name in PARITY_PANELS.items():
+        params = {"limit": limit} if panel in _RANKED_PANELS else {}
+        # __wrapped__ is the SQL loader without the snapshot decorator
+        loader = getattr(insights, loader_name).__wrapped__
+        async with AsyncSessionLocal() as db:
+            expected = await loader(db, **params)
+        actual = await snapshot_store.query(panel, **params)
+        results[panel] = _rows_match(panel, expected, actual)
+        if not results[panel]:
+            logger.error(
+                f"Snapshot {panel} differs from SQL: {expected[:3]} != {actual[:3]}"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the insights columnar snapshot.")
+    parser.add_argument(
+        "--check", action="store_true", help="Compare every panel with its SQL loader"
+    )
+    args = parser.parse_args()
+
+    if not args.check:
+        print(
+            f"{snapshot_store.refresh(rebuild=True)} row(s) loaded: "
+            f"{snapshot_store.stats()['rows']}"
+        )
+        sys.exit(0)
+    parity = asyncio.run(check_parity())
+    for panel, matches in parity.items():
+        print(f"{panel}: {'ok' if matches else 'MISMATCH'}")
+    sys.exit(0 if all(parity.values()) else 1)
@@ -0,0 +1,472 @@
+"""Workload recording and index suggestions for the insights and agent queries.
+
+Every read statement the process runs is recorded, grouped by its shape (literals
+replaced), with a count, total time, its origin and one sample with parameters. The
+advisor runs `EXPLAIN (FORMAT JSON)` on each sample and collects the columns used in
+join conditions, filters and group keys of tables that are read with a sequential scan.
+Columns that do not already lead an index are suggested, weighted by how often and how
+long their statements ran, next to the usage of the existing indexes from
+`pg_stat_user_indexes`.
+
+The recorded workload is served by `GET /api/v1/admin/db/workload` and the advice by
+`GET /api/v1/admin/db/index-advice`. The served samples have their parameters redacted
+unless `WORKLOAD_LOG_PARAMETERS` is set; a redacted sample is explained as a generic
+plan (`EXPLAIN (GENERIC_PLAN)`, PostgreSQL 16+). From the command line, the insights
+routes are replayed in-process to record their workload; `--url` adds the workload a
+running server recorded (agent SQL included), and `--apply` creates the suggested
+indexes concurrently:
+
+    python -m app.db.index_advisor
+    python -m app.db.index_advisor --url http://localhost:8000 --apply
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.logger import get_logger
+
+from .database import get_engine
+from .slow_queries import REDACTED, generic_statement, query_origin
+
+logger = get_logger(__name__)
+
+# Distinct statement shapes kept; 0 disables recording
+WORKLOAD_LOG_SIZE = int(os.getenv("WORKLOAD_LOG_SIZE", "500"))
+# Serve the sample parameters with the workload instead of redacting them
+WORKLOAD_LOG_PARAMETERS = os.getenv("WORKLOAD_LOG_PARAMETERS", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Tables with fewer (estimated) rows than this are left to sequential scans
+INDEX_ADVISOR_MIN_ROWS = int(os.getenv("INDEX_ADVISOR_MIN_ROWS", "10000"))
+
+_READ_STATEMENT = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_COLUMN_REFERENCE = re.compile(
+    r"\b([a-z_][a-z0-9_]*)\.([a-z_][a-z0-9_]*)\b", re.IGNORECASE
+)
+_IDENTIFIER = re.compile(r"(?<!['.\w])([a-z_][a-z0-9_]*)\b(?!\s*\()", re.IGNORECASE)
+# Plan keys holding expressions, and the kind of use they stand for
+_PLAN_EXPRESSIONS = {
+    "Hash Cond": "join",
+    "Merge Cond": "join",
+    "Join Filter": "join",
+    "Filter": "filter",
+    "Group Key": "group",
+}
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement shape used to group executions: literals replaced, whitespace
+    collapsed."""
+    return " ".join(_LITERAL.sub("?", statement).split())
+
+
+class WorkloadRecorder:
+    def __init__(self, size: int, log_parameters: bool = False):
+        self.size = size
+        self.log_parameters = log_parameters
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def record(self, statement: str, parameters: Any, duration_ms: float) -> None:
+        key = normalize_statement(statement)
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                if len(self._statements) >= self.size:
+                    self._dropped += 1
+                    return
+                entry = self._statements[key] = {
+                    "statement": statement,
+                    "parameters": parameters,
+                    "origins": Counter(),
+                    "count": 0,
+                    "total_ms": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["origins"][query_origin.get()] += 1
+
+    def entries(self, parameters: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Recorded statements, most total time first, in a JSON-friendly form.
+
+        Sample parameters are redacted unless `parameters` (default: `log_parameters`)
+        is true.
+        """
+        show = self.log_parameters if parameters is None else parameters
+        with self._lock:
+            entries = [
+                {
+                    "statement": e["statement"],
+                    "parameters": _jsonable(e["parameters"])
+                    if show or not e["parameters"]
+                    else REDACTED,
+                    "origins": dict(e["origins"]),
+                    "count": e["count"],
+                    "total_ms": round(e["total_ms"], 2),
+                }
+                for e in self._statements.values()
+            ]
+        return sorted(entries, key=lambda e: e["total_ms"], reverse=True)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._statements)
+            self._statements.clear()
+            return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "statements": len(self._statements),
+                "capacity": self.size,
+                "dropped": self._dropped,
+            }
+
+
+def _jsonable(parameters: Any) -> Any:
+    """Parameters as JSON values; anything else (dates, decimals) becomes its string
+    form."""
+    return json.loads(json.dumps(parameters, default=str)) if parameters else None
+
+
+workload_recorder = WorkloadRecorder(WORKLOAD_LOG_SIZE, WORKLOAD_LOG_PARAMETERS)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    if context is not None:
+        context._workload_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    started = getattr(context, "_workload_started", None)
+    if (
+        started is None
+        or workload_recorder.size <= 0
+        or executemany
+        or conn.dialect.name != "postgresql"
+        or context.execution_options.get("skip_slow_query_log")
+        or not _READ_STATEMENT.match(statement)
+    ):
+        return
+    workload_recorder.record(
+        statement, parameters, (time.perf_counter() - started) * 1000
+    )
+
+
+def _plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _explain(conn: Connection, statement: str, parameters: Any) -> Dict[str, Any]:
+    if parameters == REDACTED:
+        rows = conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON, GENERIC_PLAN) {generic_statement(statement)}"
+        ).all()
+    else:
+        rows = conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters or None
+        ).all()
+    plan = rows[0][0]
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+def _existing_indexes(conn: Connection) -> Tuple[set, List[Dict[str, Any]]]:
+    """Leading (table, column) of every index, and usage of the user indexes."""
+    leading = {
+        (r.table_name, r.column_name)
+        for r in conn.execute(
+            text(
+                "SELECT t.relname AS table_name, a.attname AS column_name "
+                "FROM pg_index i "
+                "JOIN pg_class t ON t.oid = i.indrelid "
+                "JOIN pg_namespace n "
+                "ON n.oid = t.relnamespace AND n.nspname = current_schema() "
+                "JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]"
+            )
+        )
+    }
+    usage = [
+        {
+            "table": r.table_name,
+            "index": r.index_name,
+            "scans": r.scans,
+            "size_bytes": r.size_bytes,
+            "unique": r.is_unique,
+        }
+        for r in conn.execute(
+            text(
+                "SELECT s.relname AS table_name, s.indexrelname AS index_name, "
+                "s.idx_scan AS scans, pg_relation_size(s.indexrelid) AS size_bytes, "
+                "i.indisunique AS is_unique "
+                "FROM pg_stat_user_indexes s "
+                "JOIN pg_index i ON i.indexrelid = s.indexrelid "
+                "WHERE s.schemaname = current_schema() "
+                "ORDER BY s.relname, s.indexrelname"
+            )
+        )
+    ]
+    return leading, usage
+
+
+def _table_rows(conn: Connection) -> Dict[str, int]:
+    return {
+        r.table_name: int(r.row_estimate)
+        for r in conn.execute(
+            text(
+                "SELECT c.relname AS table_name, "
+                "greatest(c.reltuples, 0) AS row_estimate "
+                "FROM pg_class c "
+                "JOIN pg_namespace n "
+                "ON n.oid = c.relnamespace AND n.nspname = current_schema() "
+                "WHERE c.relkind = 'r'"
+            )
+        )
+    }
+
+
+def _table_columns(conn: Connection) -> Dict[str, set]:
+    columns: Dict[str, set] = {}
+    for r in conn.execute(
+        text(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema()"
+        )
+    ):
+        columns.setdefault(r.table_name, set()).add(r.column_name)
+    return columns
+
+
+def _column_uses(nodes: List[Dict[str, Any]], table_columns: Dict[str, set]) -> set:
+    """(table, column, kind) for columns that an index could serve in this plan."""
+    aliases = {n["Alias"]: n["Relation Name"] for n in nodes if "Relation Name" in n}
+    seq_scanned = {
+        n["Relation Name"] for n in nodes if n.get("Node Type") == "Seq Scan"
+    }
+    uses, filtered = set(), set()
+    for node in nodes:
+        for key, kind in _PLAN_EXPRESSIONS.items():
+            expressions = node.get(key) or []
+            for expression in (
+                expressions if isinstance(expressions, list) else [expressions]
+            ):
+                for alias, column in _COLUMN_REFERENCE.findall(expression):
+                    uses.add((aliases.get(alias, alias), column, kind))
+                # Conditions on a scan node name the scanned table's columns without a
+                # qualifier. A filter there discards fetched rows whatever the scan
+                # type, so it counts even when the table is reached through another
+                # index.
+                relation = node.get("Relation Name")
+                if relation:
+                    for word in _IDENTIFIER.findall(
+                        _COLUMN_REFERENCE.sub("", expression)
+                    ):
+                        if word in table_columns.get(relation, ()):
+                            (filtered if kind == "filter" else uses).add(
+                                (relation, word, kind)
+                            )
+    uses = {(t, c, kind) for t, c, kind in uses if t in seq_scanned}
+    return {
+        (t, c, kind) for t, c, kind in uses | filtered if c in table_columns.get(t, ())
+    }
+
+
+def index_name(table: str, column: str) -> str:
+    # Same name SQLAlchemy gives `Column(..., index=True)`, so models and advice agree
+    return f"ix_{table}_{column}"
+
+
+def create_index_statement(table: str, column: str) -> str:
+    return (
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name(table, column)}" ON '
+        f'"{table}" ("{column}")'
+    )
+
+
+def advise(
+    workload: List[Dict[str, Any]], engine: Optional[Engine] = None
+) -> Dict[str, Any]:
+    """Suggest single-column indexes for `workload` (entries as returned by
+    `WorkloadRecorder.entries`)."""
+    logger.info(f"Entering advise: {len(workload)} statement(s)")
+    candidates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    failed = []
+    with (engine or get_engine()).connect() as conn:
+        conn = conn.execution_options(skip_slow_query_log=True)
+        leading, usage = _existing_indexes(conn)
+        table_rows = _table_rows(conn)
+        table_columns = _table_columns(conn)
+        conn.rollback()
+        for entry in workload:
+            try:
+                plan = _explain(conn, entry["statement"], entry.get("parameters"))
+            except Exception as e:
+                conn.rollback()
+                failed.append(
+                    {
+                        "statement": entry["statement"][:200],
+                        "error": str(e).splitlines()[0],
+                    }
+                )
+                continue
+            conn.rollback()
+
+            uses = _column_uses(list(_plan_nodes(plan)), table_columns)
+            for table, column, kind in uses:
+                candidate = candidates.setdefault(
+                    (table, column),
+                    {"uses": Counter(), "count": 0, "total_ms": 0.0, "origins": set()},
+                )
+                candidate["uses"][kind] += 1
+            for table, column in {(t, c) for t, c, _ in uses}:
+                candidate = candidates[(table, column)]
+                candidate["count"] += entry.get("count", 1)
+                candidate["total_ms"] += entry.get("total_ms", 0.0)
+                candidate["origins"].update(entry.get("origins", {}))
+
+    suggestions = []
+    for (table, column), candidate in candidates.items():
+        if (table, column) in leading or table_rows.get(
+            table, 0
+        ) < INDEX_ADVISOR_MIN_ROWS:
+            continue
+        suggestions.append(
+            {
+                "table": table,
+                "column": column,
+                "uses": dict(candidate["uses"]),
+                "statements_count": candidate["count"],
+                "statements_total_ms": round(candidate["total_ms"], 2),
+                "table_rows": table_rows.get(table, 0),
+                "origins": sorted(candidate["origins"]),
+                "sql": create_index_statement(table, column),
+            }
+        )
+    suggestions.sort(
+        key=lambda s: (s["statements_total_ms"], s["statements_count"]), reverse=True
+    )
+    return {
+        "suggestions": suggestions,
+        "unused_indexes": [u for u in usage if not u["scans"] and not u["unique"]],
+        "index_usage": usage,
+        "explain_failures": failed,
+        "statements_analyzed": len(workload) - len(failed),
+    }
+
+
+def apply_suggestions(
+    suggestions: List[Dict[str, Any]], engine: Optional[Engine] = None
+) -> None:
+    """Create the suggested indexes without blocking writes (CONCURRENTLY needs
+    autocommit)."""
+    with (engine or get_engine()).connect() as conn:
+        conn = conn.execution_options(
+            isolation_level="AUTOCOMMIT", skip_slow_query_log=True
+        )
+        for suggestion in suggestions:
+            started = time.perf_counter()
+            conn.exec_driver_sql(suggestion["sql"])
+            logger.info(
+                f"Created {index_name(suggestion['table'], suggestion['column'])} in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+
+
+async def _record_insights_workload() -> None:
+    """Replay the insights routes in-process so their statements are recorded."""
+    import httpx
+
+    from app.main import app
+    from benchmarks.run import INSIGHTS_ENDPOINTS
+
+    from .database import async_engine
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://index-advisor", timeout=300
+        ) as client:
+            for path in INSIGHTS_ENDPOINTS:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    logger.warning(f"{path} returned {response.status_code}")
+    finally:
+        await async_engine.dispose()
+
+
+def _fetch_server_workload(url: str) -> List[Dict[str, Any]]:
+    import httpx
+
+    response = httpx.get(f"{url.rstrip('/')}/api/v1/admin/db/workload", timeout=30)
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Suggest indexes for the recorded query workload."
+    )
+    parser.add_argument(
+        "--url", help="also analyze the workload recorded by this running server"
+    )
+    parser.add_argument(
+        "--no-replay",
+        action="store_true",
+        help="skip replaying the insights routes in-process",
+    )
+    parser.add_argument(
+        "--apply", action="store_true", help="create the suggested indexes concurrently"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print the full advice as JSON"
+    )
+    args = parser.parse_args()
+
+    if not args.no_replay:
+        asyncio.run(_record_insights_workload())
+    workload = workload_recorder.entries(parameters=True)
+    if args.url:
+        workload += _fetch_server_workload(args.url)
+    advice = advise(workload)
+
+    if args.json:
+        print(json.dumps(advice, indent=2))
+    else:
+        print(f"Analyzed {advice['statements_analyzed']} statement(s)")
+        for s in advice["suggestions"]:
+            uses = ", ".join(f"{kind} x{n}" for kind, n in s["uses"].items())
+            print(
+                f"  {s['table']}.{s['column']:<20} {uses:<28} "
+                f"{s['statements_count']:>6} runs "
+                f"{s['statements_total_ms']:>10.1f} ms  ~{s['table_rows']} rows"
+            )
+        for u in advice["unused_indexes"]:
+            print(
+                f"  unused: {u['index']} on {u['table']} "
+                f"({u['size_bytes']} bytes, 0 scans)"
+            )
+        for f in advice["explain_failures"]:
+            print(f"  could not EXPLAIN: {f['error']}: {f['statement']}")
+    if args.apply and advice["suggestions"]:
+        apply_suggestions(advice["suggestions"])
@@ -40,7 +40,9 @@ class Film(Base):
     title = Column(String(255), nullable=False)
     description = Column(Text)
     release_year = Column(String(4))
-    language_id = Column(SmallInteger, ForeignKey("language.language_id"), nullable=False)
+    language_id = Column(
+        SmallInteger, ForeignKey("language.language_id"), nullable=False
+    )
     original_language_id = Column(SmallInteger, ForeignKey("language.language_id"))
     rental_duration = Column(SmallInteger, nullable=False, default=3)
     rental_rate = Column(Numeric(4, 2), nullable=False, default=4.99)
@@ -53,18 +55,22 @@ class Film(Base):
     original_language = relationship("Language", foreign_keys=[original_language_id])
     inventory = relationship("Inventory", back_populates="film")
     actors = relationship("Actor", secondary="film_actor", back_populates="films")
-    categories = relationship("Category", secondary="film_category", back_populates="films")
+    categories = relationship(
+        "Category", secondary="film_category", back_populates="films"
+    )
 
 
 class Customer(Base):
     __tablename__ = "customer"
 
     customer_id = Column(Integer, primary_key=True)
-    store_id = Column(Integer, ForeignKey("store.store_id"), nullable=False)
+    store_id = Column(Integer, ForeignKey("store.store_id"), nullable=False, index=True)
     first_name = Column(String(45), nullable=False)
     last_name = Column(String(45), nullable=False)
     email = Column(String(50))
-    address_id = Column(Integer, ForeignKey("address.address_id"), nullable=False)
+    address_id = Column(
+        Integer, ForeignKey("address.address_id"), nullable=False, index=True
+    )
     active = Column(Boolean, nullable=False, default=True)
     create_date = Column(DateTime, nullable=False)
     last_update = Column(DateTime, nullable=False)
@@ -78,8 +84,12 @@ class Store(Base):
     __tablename__ = "store"
 
     store_id = Column(Integer, primary_key=True)
-    manager_staff_id = Column(SmallInteger, ForeignKey("staff.staff_id"), nullable=False)
-    address_id = Column(Integer, ForeignKey("address.address_id"), nullable=False)
+    manager_staff_id = Column(
+        SmallInteger, ForeignKey("staff.staff_id"), nullable=False
+    )
+    address_id = Column(
+        Integer, ForeignKey("address.address_id"), nullable=False, index=True
+    )
     last_update = Column(DateTime, nullable=False)
     address = relationship("Address", back_populates="stores")
     manager = relationship("Staff", foreign_keys=[manager_staff_id])
@@ -92,11 +102,17 @@ class Rental(Base):
 
     rental_id = Column(Integer, primary_key=True)
     rental_date = Column(DateTime, nullable=False)
-    inventory_id = Column(Integer, ForeignKey("inventory.inventory_id"), nullable=False)
-    customer_id = Column(Integer, ForeignKey("customer.customer_id"), nullable=False)
+    inventory_id = Column(
+        Integer, ForeignKey("inventory.inventory_id"), nullable=False, index=True
+    )
+    customer_id = Column(
+        Integer, ForeignKey("customer.customer_id"), nullable=False, index=True
+    )
     return_date = Column(DateTime)
-    staff_id = Column(SmallInteger, ForeignKey("staff.staff_id"), nullable=False)
-    last_update = Column(DateTime, nullable=False)
+    staff_id = Column(
+        SmallInteger, ForeignKey("staff.staff_id"), nullable=False, index=True
+    )
+    last_update = Column(DateTime, nullable=False, index=True)
     inventory = relationship("Inventory", back_populates="rentals")
     customer = relationship("Customer", back_populates="rentals")
     staff = relationship("Staff", back_populates="rentals")
@@ -107,12 +123,14 @@ class Payment(Base):
     __tablename__ = "payment"
 
     payment_id = Column(Integer, primary_key=True)
-    customer_id = Column(Integer, ForeignKey("customer.customer_id"), nullable=False)
+    customer_id = Column(
+        Integer, ForeignKey("customer.customer_id"), nullable=False, index=True
+    )
     staff_id = Column(SmallInteger, ForeignKey("staff.staff_id"), nullable=False)
-    rental_id = Column(Integer, ForeignKey("rental.rental_id"))
+    rental_id = Column(Integer, ForeignKey("rental.rental_id"), index=True)
     amount = Column(Numeric(5, 2), nullable=False)
-    payment_date = Column(DateTime, nullable=False)
-    last_update = Column(DateTime, nullable=False)
+    payment_date = Column(DateTime, nullable=False, index=True)
+    last_update = Column(DateTime, nullable=False, index=True)
     customer = relationship("Customer", back_populates="payments")
     staff = relationship("Staff", back_populates="payments")
     rental = relationship("Rental", back_populates="payments")
@@ -132,7 +150,9 @@ class City(Base):
 
     city_id = Column(Integer, primary_key=True)
     city = Column(String(50), nullable=False)
-    country_id = Column(SmallInteger, ForeignKey("country.country_id"), nullable=False)
+    country_id = Column(
+        SmallInteger, ForeignKey("country.country_id"), nullable=False, index=True
+    )
     last_update = Column(DateTime, nullable=False)
     country = relationship("Country", back_populates="cities")
     addresses = relationship("Address", back_populates="city")
@@ -145,7 +165,7 @@ class Address(Base):
     address = Column(String(50), nullable=False)
     address2 = Column(String(50))
     district = Column(String(20), nullable=False)
-    city_id = Column(Integer, ForeignKey("city.city_id"), nullable=False)
+    city_id = Column(Integer, ForeignKey("city.city_id"), nullable=False, index=True)
     postal_code = Column(String(10))
     phone = Column(String(20), nullable=False)
     last_update = Column(DateTime, nullable=False)
@@ -187,8 +207,8 @@ class Inventory(Base):
     __tablename__ = "inventory"
 
     inventory_id = Column(Integer, primary_key=True)
-    film_id = Column(Integer, ForeignKey("film.film_id"), nullable=False)
-    store_id = Column(Integer, ForeignKey("store.store_id"), nullable=False)
+    film_id = Column(Integer, ForeignKey("film.film_id"), nullable=False, index=True)
+    store_id = Column(Integer, ForeignKey("store.store_id"), nullable=False, index=True)
     last_update = Column(DateTime, nullable=False)
     film = relationship("Film", back_populates="inventory")
     store = relationship("Store", back_populates="inventory")
@@ -199,7 +219,7 @@ class FilmActor(Base):
     __tablename__ = "film_actor"
 
     actor_id = Column(Integer, ForeignKey("actor.actor_id"), primary_key=True)
-    film_id = Column(Integer, ForeignKey("film.film_id"), primary_key=True)
+    film_id = Column(Integer, ForeignKey("film.film_id"), primary_key=True, index=True)
     last_update = Column(DateTime, nullable=False)
 
 
@@ -207,5 +227,30 @@ class FilmCategory(Base):
     __tablename__ = "film_category"
 
     film_id = Column(Integer, ForeignKey("film.film_id"), primary_key=True)
-    category_id = Column(SmallInteger, ForeignKey("category.category_id"), primary_key=True)
+    category_id = Column(
+        SmallInteger, ForeignKey("category.category_id"), primary_key=True, index=True
+    )
+    last_update = Column(DateTime, nullable=False)
+
+
+class SalesMonthlyRollup(Base):
+    """Pre-aggregated monthly sales, maintained by app.db.rollups."""
+
+    __tablename__ = "sales_monthly_rollup"
+
+    month = Column(DateTime, primary_key=True)
+    sales = Column(Numeric, nullable=False)
+    profit = Column(Numeric, nullable=False)
+    expenses = Column(Numeric, nullable=False)
+    customers = Column(Integer, nullable=False)
+    last_update = Column(DateTime, nullable=False)
+
+
+class RollupWatermark(Base):
+    """Highest source `last_update` already folded into a rollup table."""
+
+    __tablename__ = "rollup_watermark"
+
+    rollup_name = Column(String(64), primary_key=True)
+    source_last_update = Column(DateTime)
     last_update = Column(DateTime, nullable=False)
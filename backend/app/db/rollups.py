@@ -0,0 +1,193 @@
+"""Incrementally maintained rollup tables for the insights endpoints.
+
+The monthly sales rollup stores one row per month of `payment_date` with the same
+figures `/insights/sales-overview` used to compute from the full `payment ⨝ rental`
+join. A refresh only recomputes the months touched by payments or rentals whose
+`last_update` is newer than the stored watermark minus `ROLLUP_WATERMARK_OVERLAP`
+seconds, so its cost follows the amount of new data rather than table size. The overlap
+picks up rows committed after a refresh whose `last_update` (set when their transaction
+started) is older than the watermark it stored; it should be longer than the longest
+write transaction. Months whose figures did not change are left alone and not counted.
+
+Deleted rows and payments moved to another month are not detected incrementally; run a
+rebuild after such corrections:
+
+    python -m app.db.rollups --rebuild
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import delete, distinct, func, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.logger import get_logger
+
+from .database import Base, async_engine
+from .models import Payment, Rental, RollupWatermark, SalesMonthlyRollup
+
+logger = get_logger(__name__)
+
+SALES_ROLLUP = "sales_monthly"
+# Seconds between scheduled refreshes; 0 disables the scheduler
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "300"))
+# Seconds before the watermark that each refresh scans again for late-committed rows
+ROLLUP_WATERMARK_OVERLAP = float(os.getenv("ROLLUP_WATERMARK_OVERLAP", "300"))
+# Any constant works as long as every worker uses the same one
+_ADVISORY_LOCK_KEY = 0x5A1E5
+
+
+async def _read_watermark(conn: AsyncConnection) -> Optional[datetime]:
+    stmt = select(RollupWatermark.source_last_update).where(
+        RollupWatermark.rollup_name == SALES_ROLLUP
+    )
+    return (await conn.execute(stmt)).scalar_one_or_none()
+
+
+async def _write_watermark(conn: AsyncConnection, watermark: datetime) -> None:
+    stmt = pg_insert(RollupWatermark).values(
+        rollup_name=SALES_ROLLUP, source_last_update=watermark, last_update=func.now()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RollupWatermark.rollup_name],
+        set_={
+            "source_last_update": stmt.excluded.source_last_update,
+            "last_update": stmt.excluded.last_update,
+        },
+    )
+    await conn.execute(stmt)
+
+
+async def refresh_sales_rollup(conn: AsyncConnection, rebuild: bool = False) -> int:
+    """Fold payments changed since the watermark into the monthly rollup.
+
+    Returns the number of months recomputed. Must run inside a transaction on `conn`.
+    """
+    locked = (
+        await conn.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}
+        )
+    ).scalar()
+    if not locked:
+        logger.info("Sales rollup refresh already running in another worker; skipping")
+        return 0
+
+    if rebuild:
+        await conn.execute(delete(SalesMonthlyRollup))
+        watermark = None
+    else:
+        watermark = await _read_watermark(conn)
+
+    # Fix the upper bound first so rows written during the refresh are picked up next
+    # time
+    latest_payment = select(func.max(Payment.last_update)).scalar_subquery()
+    latest_rental = select(func.max(Rental.last_update)).scalar_subquery()
+    high_water = (
+        await conn.execute(select(func.greatest(latest_payment, latest_rental)))
+    ).scalar()
+    if high_water is None:
+        return 0
+
+    month = func.date_trunc("month", Payment.payment_date)
+    aggregate = (
+        select(
+            month.label("month"),
+            func.sum(Payment.amount).label("sales"),
+            func.sum(Payment.amount * 0.7).label(
+                "profit"
+            ),  # Assuming 70% profit margin
+            func.sum(Payment.amount * 0.3).label("expenses"),  # Assuming 30% expenses
+            func.count(distinct(Rental.customer_id)).label("customers"),
+            func.now().label("last_update"),
+        )
+        .join(Rental, Payment.rental_id == Rental.rental_id)
+        .group_by(month)
+    )
+    if watermark is not None:
+        # Only recompute the months containing payments or rentals changed since the
+        # watermark, starting a little earlier so rows that committed late are not
+        # missed
+        since = watermark - timedelta(seconds=ROLLUP_WATERMARK_OVERLAP)
+        changed = (
+            select(distinct(func.date_trunc("month", Payment.payment_date)))
+            .join(Rental, Payment.rental_id == Rental.rental_id)
+            .where(or_(Payment.last_update > since, Rental.last_update > since))
+        )
+        aggregate = aggregate.where(month.in_(changed))
+
+    upsert = pg_insert(SalesMonthlyRollup).from_select(
+        ["month", "sales", "profit", "expenses", "customers", "last_update"], aggregate
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[SalesMonthlyRollup.month],
+        set_={
+            column: upsert.excluded[column]
+            for column in ("sales", "profit", "expenses", "customers", "last_update")
+        },
+        # Months rescanned because of the overlap usually come out the same; skip those.
+        # Profit and expenses follow from sales (and carry float noise), so they are not
+        # compared
+        where=or_(
+            SalesMonthlyRollup.sales.is_distinct_from(upsert.excluded.sales),
+            SalesMonthlyRollup.customers.is_distinct_from(upsert.excluded.customers),
+        ),
+    )
+    # rowcount is not reported for INSERT ... SELECT here, so count the returned months
+    months = len((await conn.execute(upsert.returning(SalesMonthlyRollup.month))).all())
+    if watermark is None or high_water > watermark:
+        await _write_watermark(conn, high_water)
+    logger.info(
+        f"Sales rollup {'rebuilt' if rebuild else 'refreshed'}: {months} "
+        f"month(s) up to {high_water}"
+    )
+    return months
+
+
+async def refresh_once(rebuild: bool = False) -> int:
+    async with async_engine.begin() as conn:
+        return await refresh_sales_rollup(conn, rebuild=rebuild)
+
+
+async def run_rollup_scheduler(
+    interval: float = ROLLUP_REFRESH_INTERVAL,
+    on_refresh: Optional[Callable[[int], Optional[Awaitable[None]]]] = None,
+) -> None:
+    """Refresh the rollup every `interval` seconds until cancelled.
+
+    `on_refresh` is called with the number of recomputed months whenever a refresh
+    changed something, e.g. to invalidate cached responses built from the rollup.
+    """
+    while True:
+        try:
+            months = await refresh_once()
+            if months and on_refresh is not None:
+                result = on_refresh(months)
+                if asyncio.iscoroutine(result):
+                    await result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error refreshing sales rollup: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the insights rollup tables.")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Recompute every month from scratch"
+    )
+    args = parser.parse_args()
+
+    async def main() -> int:
+        async with async_engine.begin() as conn:
+            tables = [SalesMonthlyRollup.__table__, RollupWatermark.__table__]
+            await conn.run_sync(
+                lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables)
+            )
+        return await refresh_once(rebuild=args.rebuild)
+
+    print(f"{asyncio.run(main())} month(s) updated")
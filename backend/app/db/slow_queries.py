@@ -0,0 +1,256 @@
+"""Slow-query log for every engine in the process.
+
+Statements slower than `SLOW_QUERY_THRESHOLD_MS` are recorded with their duration and
+origin (the HTTP route or agent thread that issued them) in a bounded ring buffer. For a
+sample of slow reads, `EXPLAIN (ANALYZE, BUFFERS)` runs on a background thread and its
+plan is attached to the entry. The buffer is served by `GET
+/api/v1/admin/db/slow-queries`.
+
+Bound parameters can hold customer data, so they are shown as "[redacted]" unless
+`SLOW_QUERY_LOG_PARAMETERS` is set. Plans of statements with parameters would show the
+values as well; while redacting, those get a generic plan instead (`EXPLAIN
+(GENERIC_PLAN)`, which needs PostgreSQL 16 and does not execute the statement).
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app.db.database import get_engine
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+# Fraction of slow reads whose plan is captured with EXPLAIN ANALYZE (which runs them
+# again)
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1")
+)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+# Show bound parameters in the log (and plans executed with them) instead of redacting
+# them
+SLOW_QUERY_LOG_PARAMETERS = os.getenv("SLOW_QUERY_LOG_PARAMETERS", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+REDACTED = "[redacted]"
+_MAX_STATEMENT_CHARS = 10000
+_MAX_PARAMETER_CHARS = 2000
+# Plans waiting for the explain thread; further offenders are recorded without a plan
+_MAX_PENDING_EXPLAINS = 4
+
+_READ_STATEMENT = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# psycopg placeholders: named, positional, and an escaped percent sign
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+query_origin: ContextVar[str] = ContextVar("query_origin", default="unknown")
+
+
+def generic_statement(statement: str) -> str:
+    """`statement` with its driver placeholders numbered ($1, $2, ...) for `EXPLAIN
+    (GENERIC_PLAN)`."""
+    numbers: Dict[str, int] = {}
+    positional = 0
+
+    def number(match: re.Match) -> str:
+        nonlocal positional
+        if match.group(0) == "%%":
+            # Still escaped: the driver formats the statement even without parameters
+            return "%%"
+        if match.group(1) is None:
+            positional += 1
+            return f"${positional}"
+        return f"${numbers.setdefault(match.group(1), len(numbers) + 1)}"
+
+    return _PLACEHOLDER.sub(number, statement)
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float,
+        size: int,
+        explain_sample_rate: float,
+        log_parameters: bool = False,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.log_parameters = log_parameters
+        self._entries: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="slow-query-explain"
+        )
+        self._pending = 0
+        self._recorded = 0
+
+    def record(
+        self,
+        statement: str,
+        parameters: Any,
+        executemany: bool,
+        duration_ms: float,
+        dialect: str,
+        is_async: bool,
+    ) -> None:
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "origin": query_origin.get(),
+            "engine": "async" if is_async else "sync",
+            "statement": statement[:_MAX_STATEMENT_CHARS],
+            "parameters": self._parameters(parameters),
+            "plan": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self._recorded += 1
+        logger.warning(
+            f"Slow query ({duration_ms:.0f} ms) from "
+            f"{entry['origin']}: {statement[:200]}"
+        )
+
+        if (
+            dialect == "postgresql"
+            and not executemany
+            and _READ_STATEMENT.match(statement)
+            and random.random() < self.explain_sample_rate
+        ):
+            with self._lock:
+                if self._pending >= _MAX_PENDING_EXPLAINS:
+                    return
+                self._pending += 1
+            self._explainer.submit(self._explain, entry, statement, parameters)
+
+    def _parameters(self, parameters: Any) -> Optional[str]:
+        if not parameters:
+            return None
+        return (
+            repr(parameters)[:_MAX_PARAMETER_CHARS] if self.log_parameters else REDACTED
+        )
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recorded statements, slowest first."""
+        with self._lock:
+            entries = sorted(
+                self._entries, key=lambda e: e["duration_ms"], reverse=True
+            )
+        return entries[:limit] if limit else entries
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold_ms,
+                "recorded": self._recorded,
+                "entries": len(self._entries),
+                "pending_explains": self._pending,
+            }
+
+    def _explain(self, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+        try:
+            with get_engine().connect() as conn:
+                conn = conn.execution_options(skip_slow_query_log=True)
+                conn.execute(
+                    text("SELECT set_config('statement_timeout', :timeout, true)"),
+                    {"timeout": f"{SLOW_QUERY_EXPLAIN_TIMEOUT_MS}ms"},
+                )
+                if parameters and not self.log_parameters:
+                    # A plan run with the values would print them; the generic one has
+                    # $1, $2, ...
+                    rows = conn.exec_driver_sql(
+                        f"EXPLAIN (GENERIC_PLAN) {generic_statement(statement)}"
+                    ).all()
+                else:
+                    # Driver-level SQL and parameters, exactly as the slow statement was
+                    # sent
+                    rows = conn.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters or None
+                    ).all()
+                conn.rollback()
+            entry["plan"] = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            entry["plan"] = f"EXPLAIN failed: {e}"
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+slow_query_log = SlowQueryLog(
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_LOG_SIZE,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_LOG_PARAMETERS,
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    started = getattr(context, "_slow_query_started", None)
+    if started is None or slow_query_log.threshold_ms <= 0:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= slow_query_log.threshold_ms and not context.execution_options.get(
+        "skip_slow_query_log"
+    ):
+        slow_query_log.record(
+            statement,
+            parameters,
+            executemany,
+            duration_ms,
+            conn.dialect.name,
+            conn.dialect.is_async,
+        )
+
+
+def set_query_origin(origin: str) -> None:
+    """Attribute statements issued from the current context (task or thread) to
+    `origin`."""
+    query_origin.set(origin)
+
+
+class QueryOriginMiddleware:
+    """Tag statements issued while serving an HTTP request with its method and path."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(
+        self, scope: Dict[str, Any], receive: Callable, send: Callable
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = query_origin.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_origin.reset(token)
@@ -1,43 +1,160 @@
+import atexit
 import logging
-import sys
 import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict
+
+import structlog
 
 # Define log file path
-LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+LOG_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
+)
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "backend.log")
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" renders one JSON object per line, "text" the classic "time - name - level -
+# message"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+# Records waiting for the writer thread; further records are dropped rather than
+# blocking callers
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Messages longer than this are cut before they are queued
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+
+
+def _parse_mapping(raw: str) -> Dict[str, str]:
+    """Parse "logger=value,other.logger=value" into a dict."""
+    mapping = {}
+    for item in raw.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip():
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+# Per-logger levels, e.g. "app.agent.graph=WARNING,sqlalchemy.engine=INFO"
+LOG_LEVELS = _parse_mapping(os.getenv("LOG_LEVELS", ""))
+# Fraction of DEBUG/INFO records kept per logger, e.g. "app.agent.graph=0.1"; warnings
+# are always kept
+LOG_SAMPLE_RATES = {
+    name: float(rate)
+    for name, rate in _parse_mapping(os.getenv("LOG_SAMPLE_RATES", "")).items()
+}
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of low-severity records from the configured loggers."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            if name in self.rates:
+                return random.random() < self.rates[name]
+            name = name.rpartition(".")[0]
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records for the writer thread, truncating long messages and never
+    blocking."""
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        # The formatters rebuild `message` from `msg`; leaving it would also show up as
+        # an extra field
+        record.__dict__.pop("message", None)
+        if self.max_chars and len(record.msg) > self.max_chars:
+            record.msg = (
+                f"{record.msg[: self.max_chars]}... "
+                f"[{len(record.msg) - self.max_chars} chars truncated]"
+            )
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 # Create formatters and handlers
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+if LOG_FORMAT == "json":
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processor=structlog.processors.JSONRenderer(),
+        foreign_pre_chain=[
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.ExtraAdder(),
+        ],
+    )
+else:
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
 
-file_handler = logging.FileHandler(LOG_FILE)
+file_handler = RotatingFileHandler(
+    LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS
+)
 file_handler.setFormatter(formatter)
-file_handler.setLevel(logging.INFO)
 
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(formatter)
-console_handler.setLevel(logging.INFO)
+
+# Callers only enqueue; formatting and disk/console writes happen on the listener's
+# thread
+queue_handler = NonBlockingQueueHandler(
+    queue.Queue(LOG_QUEUE_SIZE), max_chars=LOG_MAX_MESSAGE_CHARS
+)
+queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+listener = QueueListener(
+    queue_handler.queue, console_handler, file_handler, respect_handler_level=True
+)
+listener.start()
+atexit.register(listener.stop)
 
 # Configure Root Logger
 # This captures EVERYTHING (app, libraries, uvicorn error, etc.)
 root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
+root_logger.setLevel(LOG_LEVEL)
 
 # Clear existing handlers (e.g. from Uvicorn default config)
 if root_logger.hasHandlers():
     root_logger.handlers.clear()
 
-root_logger.addHandler(console_handler)
-root_logger.addHandler(file_handler)
+root_logger.addHandler(queue_handler)
 
 # Configure Uvicorn Access Logger explicitly to ensure access logs stored
 # Uvicorn sometimes uses its own non-propagating logger for access logs
 uvicorn_access = logging.getLogger("uvicorn.access")
 if uvicorn_access.hasHandlers():
     uvicorn_access.handlers.clear()
-uvicorn_access.addHandler(console_handler)
-uvicorn_access.addHandler(file_handler)
-uvicorn_access.propagate = False # Keep it separate or True if we want double logging (safest is explicit handlers + no propagate)
+uvicorn_access.addHandler(queue_handler)
+# Keep it separate or True if we want double logging (safest is explicit handlers + no
+# propagate)
+uvicorn_access.propagate = False
+
+for _name, _level in LOG_LEVELS.items():
+    logging.getLogger(_name).setLevel(_level.upper())
+
 
 def get_logger(name: str) -> logging.Logger:
     """
@@ -45,4 +162,8 @@ def get_logger(name: str) -> logging.Logger:
     Since we configured the root logger, we just return the requested logger.
     It will propagate up to root and be logged.
     """
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
+
+
+def logging_stats() -> Dict[str, int]:
+    return {"queued": queue_handler.queue.qsize(), "dropped": queue_handler.dropped}
@@ -1,25 +1,74 @@
 # python
-import logging
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
 from copilotkit import CopilotKitRemoteEndpoint, LangGraphAgent
 from copilotkit.integrations.fastapi import add_fastapi_endpoint
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
-from .agent.graph import graph
-from .api import insights
-from .db.database import Base, engine
+from . import metrics
+from .agent.answer_cache import answer_cache
+from .agent.checkpointer import checkpointer_stats
+from .agent.executor import db_executor
+from .agent.graph import graph, memory
+from .agent.query_cache import query_cache
+from .api import admin, insights
+from .api.cache import insights_cache
+from .api.responses import response_cache_stats
+from .db.columnar import INSIGHTS_ENGINE, run_snapshot_refresher, snapshot_store
+from .db.database import Base, engine, pool_stats
+from .db.rollups import ROLLUP_REFRESH_INTERVAL, run_rollup_scheduler
+from .db.slow_queries import QueryOriginMiddleware
+from .logger import get_logger
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = []
+    if ROLLUP_REFRESH_INTERVAL > 0:
+        # Keep the monthly sales rollup current and drop cached overviews when it
+        # changes
+        background.append(
+            asyncio.create_task(
+                run_rollup_scheduler(
+                    on_refresh=lambda _: insights_cache.invalidate("sales-overview")
+                )
+            )
+        )
+    if INSIGHTS_ENGINE == "columnar":
+        # Load the columnar snapshot the insights endpoints answer from and keep it
+        # current
+        background.append(
+            asyncio.create_task(
+                run_snapshot_refresher(on_refresh=insights_cache.invalidate)
+            )
+        )
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+
+
 app = FastAPI(
-    title="InsightCopilot API", description="API for extracting insights from the Sakila database", version="1.0.0"
+    title="InsightCopilot API",
+    description="API for extracting insights from the Sakila database",
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson encodes responses several times faster than the standard json module
+    default_response_class=ORJSONResponse,
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(QueryOriginMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -38,10 +87,35 @@ sdk = CopilotKitRemoteEndpoint(
     ],
 )
 
-# If agent may perform blocking work, consider setting use_thread_pool=True
+# The agent tools hand their blocking database work to a bounded executor
+# (app.agent.executor), so the endpoint itself stays on the event loop
 add_fastapi_endpoint(app, sdk, "/copilotkit", use_thread_pool=False)
 
 app.include_router(insights.router, prefix="/api/v1", tags=["insights"])
+app.include_router(admin.router, prefix="/api/v1", tags=["admin"])
+app.include_router(metrics.router, tags=["metrics"])
+
+# State owned by other components, read on each /metrics scrape
+metrics.register_stats("db_pool", "Connection pool", pool_stats, label="engine")
+metrics.register_stats(
+    "agent_db_executor", "Agent database executor", db_executor.stats
+)
+metrics.register_stats(
+    "agent_checkpoints", "Conversation checkpointer", lambda: checkpointer_stats(memory)
+)
+metrics.register_stats(
+    "insights_cache", "Insights response cache", insights_cache.stats
+)
+metrics.register_stats(
+    "insights_encoded_bodies", "Encoded insights response bodies", response_cache_stats
+)
+metrics.register_stats(
+    "insights_snapshot", "Insights columnar snapshot", snapshot_store.stats
+)
+metrics.register_stats(
+    "agent_query_cache", "Agent query result cache", query_cache.stats
+)
+metrics.register_stats("agent_answer_cache", "Agent answer cache", answer_cache.stats)
 
 
 @app.get("/")
@@ -62,4 +136,4 @@ if __name__ == "__main__":
         timeout_keep_alive=120,
         log_level="info",
         proxy_headers=True,
-    )
\ No newline at end of file
+    )
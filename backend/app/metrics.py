@@ -0,0 +1,257 @@
+"""Prometheus metrics for the API, the database and the agent, served at `/metrics`.
+
+Metrics are defined here and recorded where the work happens: HTTP latency by the ASGI
+middleware below, statement timing through SQLAlchemy engine events, pool waits by the
+pool classes in `app.db.database`, and LLM and tool timings by the agent. Values that
+already live elsewhere (pool occupancy, executor queue, checkpointed threads) are read
+when `/metrics` is scraped.
+"""
+
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to complete an HTTP request, including a streamed body",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ["route"]
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Time the database took to execute a statement",
+    ["engine", "statement"],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows",
+    "Rows reported by the driver for a statement",
+    ["engine", "statement"],
+    buckets=_ROW_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["engine"],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Pool checkouts that timed out", ["engine"]
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "agent_llm_call_duration_seconds",
+    "Latency of one model call in call_model",
+    ["model", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "agent_llm_tokens_total", "Tokens used by model calls", ["model", "kind"]
+)
+AGENT_CACHED_STEPS = Counter(
+    "agent_cached_steps_total",
+    "call_model steps answered from the answer cache without a model call",
+    ["kind"],
+)
+TOOL_SECONDS = Histogram(
+    "agent_tool_duration_seconds",
+    "Execution time of an agent tool",
+    ["tool", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+_STATEMENT = re.compile(r"^\s*(\w+)")
+_STATEMENT_KINDS = {
+    "select",
+    "insert",
+    "update",
+    "delete",
+    "with",
+    "explain",
+    "create",
+    "alter",
+    "drop",
+    "copy",
+}
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Time every HTTP request by route template, until its (possibly streamed) body
+    completes."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(
+        self, scope: Dict[str, Any], receive: Callable, send: Callable
+    ) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        # The matched route is only known once routing ran, so in-flight counts use the
+        # raw path prefix
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(_path_group(scope["path"]))
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status["code"]),
+            ).observe(time.perf_counter() - started)
+
+
+def _path_group(path: str) -> str:
+    return (
+        "/copilotkit"
+        if path.startswith("/copilotkit")
+        else "/api"
+        if path.startswith("/api")
+        else "other"
+    )
+
+
+def _statement_kind(statement: str) -> str:
+    match = _STATEMENT.match(statement)
+    kind = match.group(1).lower() if match else ""
+    return kind if kind in _STATEMENT_KINDS else "other"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    labels = ("async" if conn.dialect.is_async else "sync", _statement_kind(statement))
+    DB_QUERY_SECONDS.labels(*labels).observe(time.perf_counter() - started.pop())
+    # Server-side cursors report -1 until they are exhausted
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        DB_QUERY_ROWS.labels(*labels).observe(cursor.rowcount)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context) -> None:
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+@contextmanager
+def track_tool(tool: str) -> Iterator[Dict[str, str]]:
+    """Time an agent tool; callers may set `outcome` on the yielded dict (default
+    "ok")."""
+    labels = {"outcome": "ok"}
+    started = time.perf_counter()
+    try:
+        yield labels
+    except BaseException:
+        labels["outcome"] = "error"
+        raise
+    finally:
+        TOOL_SECONDS.labels(tool, labels["outcome"]).observe(
+            time.perf_counter() - started
+        )
+
+
+def record_llm_call(
+    model: str, seconds: float, outcome: str, usage: Optional[Dict[str, Any]] = None
+) -> None:
+    LLM_CALL_SECONDS.labels(model, outcome).observe(seconds)
+    for kind in ("input_tokens", "output_tokens"):
+        if usage and usage.get(kind):
+            LLM_TOKENS.labels(model, kind.split("_")[0]).inc(usage[kind])
+
+
+class StatsCollector:
+    """Expose numeric fields of a stats dict as gauges, read at scrape time."""
+
+    def __init__(
+        self,
+        prefix: str,
+        documentation: str,
+        stats: Callable[[], Dict[str, Any]],
+        label: Optional[str] = None,
+    ):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+        self.label = label
+
+    def describe(self):
+        # Names depend on the stats at scrape time; skip the registry's duplicate check
+        return []
+
+    def collect(self):
+        data = self.stats()
+        groups = data.items() if self.label else [(None, data)]
+        families: Dict[str, GaugeMetricFamily] = {}
+        for group, values in groups:
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.prefix}_{key}"
+                if name not in families:
+                    families[name] = GaugeMetricFamily(
+                        name,
+                        f"{self.documentation}: {key}",
+                        labels=[self.label] if self.label else None,
+                    )
+                families[name].add_metric([group] if self.label else [], value)
+        return list(families.values())
+
+
+def register_stats(
+    prefix: str,
+    documentation: str,
+    stats: Callable[[], Dict[str, Any]],
+    label: Optional[str] = None,
+):
+    REGISTRY.register(StatsCollector(prefix, documentation, stats, label))
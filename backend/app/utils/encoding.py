@@ -0,0 +1,98 @@
+"""Wire formats for tabular results: orjson records, columnar JSON and Arrow IPC.
+
+The columnar form sends each column once as an array, after a schema header:
+
+    {"schema": [{"name": "title", "type": "string"}, ...],
+     "columns": [["A", "B"], ...],
+     "row_count": 2}
+
+Arrow IPC streams carry the same rows with Arrow's own types, for bulk consumers.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+import pyarrow as pa
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def json_default(value: Any) -> Any:
+    """orjson fallback for the database types it does not encode natively."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _value_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, (float, Decimal)):
+        return "float"
+    if isinstance(value, datetime):
+        return "timestamp"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, time):
+        return "time"
+    return "string"
+
+
+def column_type(values: Sequence[Any]) -> Optional[str]:
+    """JSON-level type of a column, taken from its first non-null value (None if all
+    null)."""
+    return next((_value_type(v) for v in values if v is not None), None)
+
+
+def columnar(names: Sequence[str], rows: Sequence[Sequence[Any]]) -> Dict[str, Any]:
+    """Column arrays plus schema header for `rows` given as tuples in `names` order."""
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in names]
+    return {
+        "schema": [
+            {"name": name, "type": column_type(column)}
+            for name, column in zip(names, columns)
+        ],
+        "columns": columns,
+        "row_count": len(rows),
+    }
+
+
+def records_to_columnar(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    names = list(records[0]) if records else []
+    return columnar(
+        names, [tuple(record.get(name) for name in names) for record in records]
+    )
+
+
+def columnar_to_records(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    names = [field["name"] for field in payload["schema"]]
+    return [dict(zip(names, row)) for row in zip(*payload["columns"])]
+
+
+def is_columnar(payload: Any) -> bool:
+    return (
+        isinstance(payload, dict)
+        and isinstance(payload.get("schema"), list)
+        and "columns" in payload
+    )
+
+
+def records_to_arrow(records: List[Dict[str, Any]]) -> bytes:
+    """Encode records as an Arrow IPC stream (one record batch)."""
+    table = pa.Table.from_pylist(records)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Load and latency benchmarks for the backend.
+
+Drives the insights endpoints and the CopilotKit agent flow at a fixed concurrency and
+reports p50/p95/p99 latency, throughput, errors and process memory per scenario. Results
+can be saved as a baseline and later runs compared against it; the exit status is 1 when
+a scenario regresses by more than `--tolerance`.
+
+By default the app from `app/main.py` is booted in-process (lifespan included), so the
+numbers include the whole ASGI stack but no network. Pass `--url` to measure a running
+server instead. The caches stay on unless `--no-cache` is given, in which case repeated
+requests measure the real work; the cache mode is saved with the results and only
+like-for-like runs are compared. The database comes from DATABASE_URL as usual; load the
+bundled Sakila data first with `python scripts/migrate_sakila.py`.
+
+Usage (from backend/):
+  python -m benchmarks.run --scenario insights --concurrency 16 --requests 500
+  python -m benchmarks.run --scenario agent --save-baseline
+  python -m benchmarks.run --scenario all --no-cache
+  python -m benchmarks.run --url http://localhost:8000 --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Tables whose row counts identify the dataset a report was recorded on
+DATASET_TABLES = ("film", "rental", "payment")
+
+INSIGHTS_ENDPOINTS = [
+    "/api/v1/insights/top-films",
+    "/api/v1/insights/category-performance",
+    "/api/v1/insights/customer-activity",
+    "/api/v1/insights/store-performance",
+    "/api/v1/insights/actor-popularity",
+    "/api/v1/insights/sales-overview",
+    "/api/v1/insights/regional-sales",
+    "/api/v1/insights/dashboard",
+]
+
+AGENT_QUESTIONS = [
+    "What is the total revenue?",
+    "What are the top 10 films by number of rentals?",
+    "How many customers does each store have?",
+    "Which 5 categories earn the most revenue?",
+]
+AGENT_NAME = "insight_copilot_agent"
+
+# Settings applied before the app is imported when --no-cache is given: insights results
+# and their encoded bodies, agent answers and agent query results are all computed every
+# time
+NO_CACHE_ENV = {
+    "INSIGHTS_CACHE_ENABLED": "false",
+    "INSIGHTS_RESPONSE_CACHE_MAX_BYTES": "0",
+    "ANSWER_CACHE_ENABLED": "false",
+    "AGENT_QUERY_CACHE_ENABLED": "false",
+}
+
+# Request function: (client, iteration) -> raises on failure
+Request = Callable[[httpx.AsyncClient, int], Awaitable[None]]
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MiB (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / 2**20 if platform.system() == "Darwin" else peak / 1024
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1)
+    )
+    return sorted_values[index]
+
+
+def get_request(path: str) -> Request:
+    async def request(client: httpx.AsyncClient, i: int) -> None:
+        response = await client.get(path)
+        response.raise_for_status()
+
+    return request
+
+
+def agent_request(questions: List[str]) -> Request:
+    async def request(client: httpx.AsyncClient, i: int) -> None:
+        body = {
+            "name": AGENT_NAME,
+            "threadId": str(uuid.uuid4()),
+            "state": {},
+            # copilotkit merges this into the graph config and fails without it
+            "config": {},
+            "actions": [],
+            "messages": [
+                {
+                    "id": str(uuid.uuid4()),
+                    "type": "TextMessage",
+                    "role": "user",
+                    "content": questions[i % len(questions)],
+                }
+            ],
+        }
+        async with client.stream(
+            "POST", "/copilotkit/agents/execute", json=body
+        ) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                pass
+
+    return request
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    request: Request,
+    total: int,
+    concurrency: int,
+    warmup: int,
+) -> Dict[str, Any]:
+    for i in range(warmup):
+        try:
+            await request(client, i)
+        except Exception:
+            pass
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await request(client, i)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                key = (
+                    type(e).__name__
+                    if not isinstance(e, httpx.HTTPStatusError)
+                    else f"HTTP {e.response.status_code}"
+                )
+                errors[key] = errors.get(key, 0) + 1
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    rss_after = rss_mb()
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 2)  # noqa: E731
+    return {
+        "requests": total,
+        "completed": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "rss_before_mb": rss_before and round(rss_before, 1),
+        "rss_after_mb": rss_after and round(rss_after, 1),
+    }
+
+
+def scenarios(selected: str, questions: List[str]) -> List[Tuple[str, Request]]:
+    chosen = []
+    if selected in ("insights", "all"):
+        chosen += [
+            (path.rsplit("/", 1)[-1], get_request(path)) for path in INSIGHTS_ENDPOINTS
+        ]
+    if selected in ("agent", "all"):
+        chosen.append(("agent", agent_request(questions)))
+    return chosen
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """Print the change against the baseline per scenario and return the regressions
+    found."""
+    regressions = []
+    print(
+        f"\n{'scenario':<22}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}"
+    )
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric, higher_is_worse in (
+            ("p50_ms", True),
+            ("p95_ms", True),
+            ("p99_ms", True),
+            ("throughput_rps", False),
+        ):
+            old, new = before.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(
+                f"{name:<22}{metric:<16}{old:>12.2f}{new:>12.2f}{change:>+10.1%}{flag}"
+            )
+            if worse:
+                regressions.append(
+                    f"{name} {metric} {old:.2f} -> {new:.2f} ({change:+.1%})"
+                )
+    return regressions
+
+
+async def dataset_rows() -> Dict[str, int]:
+    """Row counts of the largest tables, stored with the report so baselines taken on
+    different data are not compared."""
+    from sqlalchemy import text
+
+    from app.db.database import async_engine
+
+    async with async_engine.connect() as conn:
+        return {
+            table: (
+                await conn.execute(text(f"SELECT count(*) FROM {table}"))
+            ).scalar_one()
+            for table in DATASET_TABLES
+        }
+
+
+def cache_mode(args: argparse.Namespace) -> str:
+    if args.url:
+        # A running server keeps whatever cache settings it was started with
+        return "server"
+    return "disabled" if args.no_cache else "enabled"
+
+
+async def main(args: argparse.Namespace) -> int:
+    questions = args.question or AGENT_QUESTIONS
+    mode = cache_mode(args)
+    if args.no_cache and args.url:
+        print(
+            "--no-cache only applies in-process; start the server with the "
+            "caches disabled instead:"
+        )
+        print(
+            "  " + " ".join(f"{name}={value}" for name, value in NO_CACHE_ENV.items())
+        )
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        else:
+            if args.no_cache:
+                # The app reads these at import time
+                os.environ.update(NO_CACHE_ENV)
+            from app.db.database import async_engine
+            from app.main import app
+
+            # Close pooled async connections on the way out so their driver threads exit
+            # too
+            stack.push_async_callback(async_engine.dispose)
+            # Run the app's lifespan (background jobs) just like uvicorn would
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://benchmark",
+                timeout=args.timeout,
+            )
+        await stack.enter_async_context(client)
+        # A running server may use another database, so the dataset is only known
+        # in-process
+        dataset = None if args.url else await dataset_rows()
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for name, request in scenarios(args.scenario, questions):
+            total = args.agent_requests if name == "agent" else args.requests
+            result = await run_scenario(
+                client, request, total, args.concurrency, args.warmup
+            )
+            results[name] = result
+            print(
+                f"{name:<22} p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms  "
+                f"p99 {result['p99_ms']:>8.2f} ms  "
+                f"{result['throughput_rps']:>8.2f} req/s  "
+                f"errors {sum(result['errors'].values())}"
+            )
+
+    report = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "cache": mode,
+        "dataset": dataset,
+        "python": platform.python_version(),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if not args.url else None,
+        "scenarios": results,
+    }
+    print(f"\npeak RSS: {report['peak_rss_mb']} MiB" if report["peak_rss_mb"] else "")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if Path(args.baseline).exists():
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("cache", "enabled") != mode:
+            print(
+                "\nBaseline was recorded with cache "
+                f"{baseline.get('cache', 'enabled')!r}, this run with {mode!r}; "
+                "not comparing. Rerun with matching --no-cache or save a new baseline."
+            )
+            return 2
+        if baseline.get("dataset") and dataset and baseline["dataset"] != dataset:
+            print(
+                f"\nBaseline was recorded on a dataset with {baseline['dataset']} "
+                f"rows, this one has {dataset}; "
+                "not comparing. Save a new baseline for this dataset."
+            )
+            return 2
+        regressions = compare(results, baseline.get("scenarios", {}), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--url", help="benchmark a running server instead of booting the app in-process"
+    )
+    parser.add_argument(
+        "--scenario", choices=["insights", "agent", "all"], default="insights"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--requests", type=int, default=200, help="requests per insights endpoint"
+    )
+    parser.add_argument(
+        "--agent-requests",
+        type=int,
+        default=20,
+        help="agent runs for the agent scenario",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=5, help="unmeasured requests before each scenario"
+    )
+    parser.add_argument(
+        "--question",
+        action="append",
+        help="agent question (repeatable); defaults to a built-in set",
+    )
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="disable the insights, answer and query caches (in-process only)",
+    )
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store this run as the new baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="allowed relative slowdown before failing",
+    )
+    parser.add_argument("--output", help="also write the full report to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
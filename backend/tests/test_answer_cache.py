@@ -0,0 +1,107 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.agent.answer_cache import (
+    AnswerCache,
+    normalize_question,
+    question_template,
+    sql_template,
+)
+from app.utils.cache import TTLCache
+
+FINGERPRINT = "schema-1"
+
+
+def _turn(question, sql, result):
+    return [
+        HumanMessage(content=question),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "run_query", "args": {"query": sql}, "id": "call-1"}],
+        ),
+        ToolMessage(content=result, tool_call_id="call-1"),
+    ]
+
+
+def _cache():
+    return AnswerCache(TTLCache(max_bytes=1024 * 1024, default_ttl=60))
+
+
+def test_normalize_question_ignores_case_punctuation_and_spacing():
+    assert normalize_question("  Top 5 FILMS, by revenue?") == "top 5 films by revenue"
+
+
+def test_question_template_replaces_numbers():
+    assert question_template("top 5 films in 2005") == (
+        "top # films in #",
+        ["5", "2005"],
+    )
+
+
+def test_sql_template_renders_new_numbers():
+    template = sql_template(
+        "SELECT title FROM film WHERE length > 90 LIMIT 5", ["5", "90"]
+    )
+    assert (
+        template.render(["10", "120"])
+        == "SELECT title FROM film WHERE length > 120 LIMIT 10"
+    )
+
+
+def test_sql_template_skips_numbers_in_literals_and_identifiers():
+    template = sql_template("SELECT '5 stars', t5.x FROM t5 LIMIT 5", ["5"])
+    assert template.render(["7"]) == "SELECT '5 stars', t5.x FROM t5 LIMIT 7"
+
+
+def test_sql_template_rejects_ambiguous_numbers():
+    assert sql_template("SELECT 5 FROM film LIMIT 5", ["5"]) is None
+    assert sql_template("SELECT title FROM film LIMIT 5", ["5", "5"]) is None
+    assert sql_template("SELECT title FROM film", []) is None
+
+
+def test_remember_then_lookup_replays_answer():
+    cache = _cache()
+    messages = _turn(
+        "How many films?", "SELECT count(*) FROM film", '[{"count": 1000}]'
+    )
+    cache.remember(messages, "There are 1000 films.", FINGERPRINT)
+
+    hit = cache.lookup([HumanMessage(content="how many films")], FINGERPRINT)
+    assert hit.content == "There are 1000 films."
+    assert cache.lookup([HumanMessage(content="how many films")], "schema-2") is None
+
+
+def test_remember_templates_numbered_questions():
+    cache = _cache()
+    messages = _turn(
+        "Top 5 films", "SELECT title FROM film LIMIT 5", '[{"title": "A"}]'
+    )
+    cache.remember(messages, "A", FINGERPRINT)
+
+    hit = cache.lookup([HumanMessage(content="top 10 films")], FINGERPRINT)
+    assert hit.tool_calls[0]["args"] == {"query": "SELECT title FROM film LIMIT 10"}
+
+
+def test_failed_turn_is_not_cached():
+    cache = _cache()
+    messages = _turn(
+        "How many films?",
+        "SELECT count(*) FROM flim",
+        "Error executing query: no such table",
+    )
+    cache.remember(messages, "I couldn't query the database.", FINGERPRINT)
+
+    assert cache.lookup([HumanMessage(content="How many films?")], FINGERPRINT) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_follow_up_questions_are_not_cached():
+    cache = _cache()
+    messages = [
+        *_turn("How many films?", "SELECT count(*) FROM film", '[{"count": 1000}]'),
+        AIMessage(content="There are 1000 films."),
+        HumanMessage(content="And actors?"),
+    ]
+    cache.remember(messages, "200", FINGERPRINT)
+
+    assert cache.lookup([HumanMessage(content="And actors?")], FINGERPRINT) is None
+    assert cache.lookup(messages, FINGERPRINT) is None
@@ -0,0 +1,88 @@
+import pytest
+
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_returns_fresh_values_and_counts_hits():
+    cache = TTLCache(max_bytes=100, default_ttl=60)
+    cache.set("a", "x")
+
+    assert cache.get("a") == "x"
+    assert cache.get("b", "default") == "default"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = TTLCache(max_bytes=10, default_ttl=60)
+    cache.set("a", "x", size=4)
+    cache.set("b", "x", size=4)
+    cache.get("a")
+    cache.set("c", "x", size=4)
+
+    assert cache.get("a") == "x"
+    assert cache.get("b") is None
+    assert cache.get("c") == "x"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_values_larger_than_the_budget_are_not_stored():
+    cache = TTLCache(max_bytes=10, default_ttl=60)
+    cache.set("a", "x", size=4)
+    cache.set("big", "x", size=11)
+
+    assert cache.get("big") is None
+    assert cache.get("a") == "x"
+
+
+def test_replacing_a_key_updates_the_byte_count():
+    cache = TTLCache(max_bytes=100, default_ttl=60)
+    cache.set("a", "x", size=40)
+    cache.set("a", "y", size=10)
+
+    assert cache.stats()["bytes"] == 10
+    assert cache.get("a") == "y"
+
+
+def test_stale_window(clock):
+    cache = TTLCache(max_bytes=100, default_ttl=10, stale_ttl=5)
+    cache.set("a", "x")
+
+    clock[0] += 12
+    entry = cache.get_entry("a")
+    assert entry.value == "x" and not entry.is_fresh
+    assert cache.get("a") is None
+    assert cache.stats()["stale_hits"] == 2
+
+    clock[0] += 5
+    assert cache.get_entry("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_per_entry_ttl(clock):
+    cache = TTLCache(max_bytes=100, default_ttl=10)
+    cache.set("short", "x", ttl=1)
+    cache.set("long", "x")
+
+    clock[0] += 2
+    assert cache.get("short") is None
+    assert cache.get("long") == "x"
+
+
+def test_invalidate_by_predicate():
+    cache = TTLCache(max_bytes=100, default_ttl=60)
+    for key in [("films", 1), ("films", 2), ("actors", 1)]:
+        cache.set(key, "x")
+
+    assert cache.invalidate(lambda key: key[0] == "films") == 2
+    assert cache.get(("actors", 1)) == "x"
+    assert cache.invalidate() == 1
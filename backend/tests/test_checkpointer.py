@@ -0,0 +1,54 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from app.agent.checkpointer import BoundedMemorySaver
+
+
+class State(TypedDict):
+    messages: Annotated[List[str], operator.add]
+
+
+def _graph(checkpointer: BoundedMemorySaver):
+    builder = StateGraph(State)
+    builder.add_node(
+        "reply", lambda state: {"messages": [f"reply {len(state['messages'])}"]}
+    )
+    builder.add_edge(START, "reply")
+    builder.add_edge("reply", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _run(graph, thread_id: str, text: str) -> List[str]:
+    config = {"configurable": {"thread_id": thread_id}}
+    return graph.invoke({"messages": [text]}, config)["messages"]
+
+
+def test_old_checkpoints_are_pruned_but_the_conversation_survives():
+    saver = BoundedMemorySaver(ttl=0, max_threads=10, keep_per_thread=2)
+    graph = _graph(saver)
+    for turn in range(5):
+        messages = _run(graph, "t1", f"question {turn}")
+    assert len(messages) == 10
+    assert len(saver.storage["t1"][""]) == 2
+    assert saver.stats()["pruned_checkpoints"] > 0
+    # Only blobs that the kept checkpoints reference are left
+    referenced = {
+        (key[0], key[1], channel, version)
+        for key, versions in saver._versions.items()
+        for channel, version in versions.items()
+    }
+    assert set(saver.blobs) <= referenced
+
+
+def test_least_recently_used_threads_are_evicted():
+    saver = BoundedMemorySaver(ttl=0, max_threads=2, keep_per_thread=1)
+    graph = _graph(saver)
+    _run(graph, "a", "hi")
+    _run(graph, "b", "hi")
+    _run(graph, "a", "again")
+    _run(graph, "c", "hi")
+    assert set(saver.storage) == {"a", "c"}
+    assert not any(key[0] == "b" for key in saver.blobs)
+    assert saver.stats()["evicted_threads"] == 1
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.agent import context
+from app.agent.context import build_prompt, split_turns, summarize_tool_result
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count len/4 tokens so the tests do not depend on tiktoken's tables
+    monkeypatch.setattr(context, "_encoding", lambda: None)
+
+
+def _turn(n, rows=3):
+    result = json.dumps([{"id": i, "title": f"film {i}"} for i in range(rows)])
+    return [
+        HumanMessage(content=f"question {n}", id=f"h{n}"),
+        AIMessage(
+            content="",
+            tool_calls=[
+                {"name": "run_query", "args": {"query": "SELECT 1"}, "id": f"c{n}"}
+            ],
+            id=f"a{n}",
+        ),
+        ToolMessage(content=result, tool_call_id=f"c{n}", id=f"t{n}"),
+        AIMessage(content=f"answer {n}", id=f"r{n}"),
+    ]
+
+
+def _build(messages, max_tokens=0, keep_recent_turns=1, summary_chars=60):
+    return build_prompt(
+        "You are a SQL agent.", messages, max_tokens, keep_recent_turns, summary_chars
+    )
+
+
+def test_split_turns_starts_a_turn_at_each_human_message():
+    turns = split_turns([*_turn(1), *_turn(2)])
+    assert [len(turn) for turn in turns] == [4, 4]
+
+
+def test_recent_turns_are_verbatim_and_old_results_compacted():
+    messages = [*_turn(1, rows=50), *_turn(2, rows=50)]
+    prompt = _build(messages)
+
+    assert isinstance(prompt.messages[0], SystemMessage)
+    assert prompt.compacted_results == 1
+    assert prompt.messages[3].content.startswith(
+        "[earlier result: 50 rows, columns id, title"
+    )
+    assert prompt.messages[7].content == messages[6].content
+    # The caller's messages are not modified
+    assert messages[2].content.startswith("[{")
+
+
+def test_old_turns_are_dropped_to_fit():
+    messages = [*_turn(1), *_turn(2), *_turn(3)]
+    full = _build(messages)
+    prompt = _build(messages, max_tokens=full.tokens - 1)
+
+    assert prompt.dropped_turns == 1
+    assert prompt.messages[1].content == "question 2"
+    assert prompt.tokens <= full.tokens - 1
+
+
+def test_oversized_current_turn_results_are_truncated():
+    messages = [*_turn(1), *_turn(2, rows=5000)]
+    prompt = _build(messages, max_tokens=2000)
+
+    assert prompt.dropped_turns == 1
+    assert prompt.truncated_results == 1
+    assert prompt.tokens <= 2000
+    result = prompt.messages[3]
+    assert isinstance(result, ToolMessage) and result.tool_call_id == "c2"
+    assert result.content.startswith('[{"id": 0')
+    assert "[TRUNCATED: cut to fit the prompt budget" in result.content
+
+
+def test_zero_budget_disables_the_cap():
+    messages = [*_turn(1), *_turn(2, rows=5000)]
+    prompt = _build(messages, max_tokens=0)
+
+    assert (prompt.dropped_turns, prompt.truncated_results) == (0, 0)
+
+
+def test_summarize_tool_result_keeps_short_results():
+    assert summarize_tool_result('[{"a": 1}]', 100) == '[{"a": 1}]'
+    assert (
+        summarize_tool_result("x" * 500, 40)
+        == "[earlier result, 500 chars: xxxxxxxxxxxx...]"
+    )
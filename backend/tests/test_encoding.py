@@ -0,0 +1,77 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+import pyarrow as pa
+
+from app.utils.encoding import (
+    columnar,
+    columnar_to_records,
+    dumps,
+    is_columnar,
+    records_to_arrow,
+    records_to_columnar,
+)
+
+RECORDS = [
+    {
+        "title": "ACADEMY DINOSAUR",
+        "rentals": 23,
+        "revenue": Decimal("36.77"),
+        "released": date(2006, 1, 1),
+    },
+    {
+        "title": "ACE GOLDFINGER",
+        "rentals": None,
+        "revenue": Decimal("52.93"),
+        "released": date(2006, 1, 1),
+    },
+]
+
+
+def test_columnar_sends_each_column_once_with_its_type():
+    payload = records_to_columnar(RECORDS)
+    assert payload["row_count"] == 2
+    assert payload["columns"][0] == ["ACADEMY DINOSAUR", "ACE GOLDFINGER"]
+    assert [(f["name"], f["type"]) for f in payload["schema"]] == [
+        ("title", "string"),
+        ("rentals", "int"),
+        ("revenue", "float"),
+        ("released", "date"),
+    ]
+    assert is_columnar(payload)
+    assert not is_columnar(RECORDS)
+
+
+def test_columnar_round_trips_to_records():
+    assert columnar_to_records(records_to_columnar(RECORDS)) == RECORDS
+
+
+def test_empty_results_keep_their_schema():
+    payload = columnar(["title", "rentals"], [])
+    assert payload == {
+        "schema": [{"name": "title", "type": None}, {"name": "rentals", "type": None}],
+        "columns": [[], []],
+        "row_count": 0,
+    }
+    assert columnar_to_records(payload) == []
+    assert records_to_columnar([]) == {"schema": [], "columns": [], "row_count": 0}
+
+
+def test_dumps_encodes_database_types():
+    row = {
+        "amount": Decimal("2.99"),
+        "at": datetime(2005, 5, 25, 11, 30, 37),
+        "raw": b"\x01\xff",
+    }
+    assert orjson.loads(dumps(row)) == {
+        "amount": 2.99,
+        "at": "2005-05-25T11:30:37",
+        "raw": "01ff",
+    }
+
+
+def test_arrow_stream_carries_the_rows():
+    rows = [{"title": r["title"], "rentals": r["rentals"]} for r in RECORDS]
+    table = pa.ipc.open_stream(records_to_arrow(rows)).read_all()
+    assert table.to_pylist() == rows
@@ -0,0 +1,44 @@
+from app.db.index_advisor import WorkloadRecorder, normalize_statement
+from app.db.slow_queries import REDACTED
+
+
+def test_normalize_statement_replaces_literals():
+    assert (
+        normalize_statement("SELECT *  FROM film\nWHERE rating = 'PG' AND length > 120")
+        == "SELECT * FROM film WHERE rating = ? AND length > ?"
+    )
+
+
+def test_statements_are_grouped_by_shape():
+    recorder = WorkloadRecorder(size=10)
+    recorder.record("SELECT * FROM film WHERE length > 120", None, 2.0)
+    recorder.record("SELECT * FROM film WHERE length > 90", None, 3.0)
+    [entry] = recorder.entries()
+    assert entry["count"] == 2
+    assert entry["total_ms"] == 5.0
+
+
+def test_sample_parameters_are_redacted_unless_requested():
+    recorder = WorkloadRecorder(size=10)
+    recorder.record(
+        "SELECT * FROM customer WHERE email = %(email)s",
+        {"email": "mary.smith@example.org"},
+        1.0,
+    )
+    assert recorder.entries()[0]["parameters"] == REDACTED
+    assert recorder.entries(parameters=True)[0]["parameters"] == {
+        "email": "mary.smith@example.org"
+    }
+
+
+def test_sample_parameters_are_served_when_enabled():
+    recorder = WorkloadRecorder(size=10, log_parameters=True)
+    recorder.record("SELECT * FROM film WHERE film_id = %(id)s", {"id": 7}, 1.0)
+    assert recorder.entries()[0]["parameters"] == {"id": 7}
+
+
+def test_capacity_is_bounded():
+    recorder = WorkloadRecorder(size=1)
+    recorder.record("SELECT 1 FROM film", None, 1.0)
+    recorder.record("SELECT 1 FROM actor", None, 1.0)
+    assert recorder.stats() == {"statements": 1, "capacity": 1, "dropped": 1}
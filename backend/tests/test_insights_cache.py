@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.api.cache import InsightsCache
+from app.utils.cache import TTLCache
+
+
+@pytest.fixture
+def insights(monkeypatch):
+    async def load(loader, params):
+        return await loader(None, **params)
+
+    monkeypatch.setattr(InsightsCache, "_load", staticmethod(load))
+    return InsightsCache(TTLCache(max_bytes=1024 * 1024, default_ttl=60))
+
+
+def test_concurrent_misses_share_one_load(insights):
+    calls = []
+
+    async def loader(db, limit):
+        calls.append(limit)
+        await asyncio.sleep(0.01)
+        return [limit]
+
+    async def run():
+        return await asyncio.gather(
+            *(insights.fetch("top-films", loader, limit=5) for _ in range(3))
+        )
+
+    assert asyncio.run(run()) == [[5], [5], [5]]
+    assert calls == [5]
+
+
+def test_refresh_started_before_invalidate_is_not_stored(insights):
+    version = [1]
+    started = []
+
+    async def loader(db):
+        value = version[0]
+        started.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        waiter = asyncio.create_task(insights.fetch("sales-overview", loader))
+        while not started:
+            await asyncio.sleep(0)
+        # The data changes while the first load is running
+        version[0] = 2
+        insights.invalidate("sales-overview")
+        first = await waiter
+        again = await insights.fetch("sales-overview", loader)
+        return first, again
+
+    assert asyncio.run(run()) == (2, 2)
+    assert started == [1, 2]
+    assert insights.stats()["refreshing"] == 0
+
+
+def test_invalidating_another_endpoint_keeps_the_load(insights):
+    async def loader(db):
+        await asyncio.sleep(0.01)
+        return "films"
+
+    async def run():
+        waiter = asyncio.create_task(insights.fetch("top-films", loader))
+        await asyncio.sleep(0)
+        insights.invalidate("sales-overview")
+        return await waiter
+
+    assert asyncio.run(run()) == "films"
+    assert insights.stats()["entries"] == 1
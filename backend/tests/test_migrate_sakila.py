@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects import postgresql as pg
+
+from scripts.migrate_sakila import (
+    _canonicalizer,
+    _to_bool,
+    _to_int,
+    _to_number,
+    _to_text,
+    column_converter,
+)
+
+
+@pytest.mark.parametrize(
+    "pg_type, expected",
+    [
+        (pg.INTEGER(), _to_int),
+        (pg.SMALLINT(), _to_int),
+        (pg.BIGINT(), _to_int),
+        (pg.NUMERIC(5, 2), _to_number),
+        (pg.DOUBLE_PRECISION(), _to_number),
+        (pg.REAL(), _to_number),
+        (pg.BOOLEAN(), _to_bool),
+        (pg.VARCHAR(45), _to_text),
+        (pg.TEXT(), _to_text),
+        (pg.BYTEA(), _to_text),
+    ],
+)
+def test_column_converter_by_type(pg_type, expected):
+    assert column_converter(pg_type) is expected
+
+
+@pytest.mark.parametrize(
+    "pg_type", [pg.TIMESTAMP(), pg.DATE(), pg.TIME(), pg.INTERVAL()]
+)
+def test_temporal_columns_only_blank_empty_strings(pg_type):
+    convert = column_converter(pg_type)
+    assert convert("2006-02-15 05:03:42") == "2006-02-15 05:03:42"
+    assert convert("1 day") == "1 day"
+    assert convert("  ") is None
+
+
+def test_interval_is_not_treated_as_an_integer():
+    assert column_converter(pg.INTERVAL()) is not _to_int
+
+
+def test_value_converters():
+    assert _to_int("12") == 12
+    assert _to_int("3.0") == 3
+    assert _to_int("") is None
+    assert _to_int("abc") is None
+    assert _to_number(" 2.99 ") == "2.99"
+    assert _to_number(4) == 4
+    assert _to_number("n/a") is None
+    assert _to_bool("Yes") is True
+    assert _to_bool(0) is False
+    assert _to_bool("maybe") is None
+    assert _to_text(b"\x01\xff") == "\\x01ff"
+    assert _to_text(7) == "7"
+
+
+def test_canonical_numbers_follow_the_column_scale():
+    canonical = _canonicalizer(pg.NUMERIC(5, 2))
+    assert canonical("2.995") == Decimal("3.00")
+    assert canonical(Decimal("2.99")) == canonical("2.990")
+    assert _canonicalizer(pg.NUMERIC())("1.50") == Decimal("1.5")
@@ -0,0 +1,58 @@
+import pytest
+from langchain_core.tools import tool
+
+from app.agent import utils
+
+
+class StubModel:
+    def bind_tools(self, tools):
+        return ("bound", StubModel(), tuple(tools))
+
+
+@pytest.fixture(autouse=True)
+def stub_models(monkeypatch):
+    monkeypatch.setenv("MODEL_PROVIDER", "stub")
+    monkeypatch.setattr(
+        utils, "_build_chat_model", lambda provider, name, kwargs: StubModel()
+    )
+    utils.clear_model_cache()
+    utils._model_cache_stats.update(hits=0, misses=0)
+    yield
+    utils.clear_model_cache()
+
+
+def _make_tool(description):
+    def run_query(query: str) -> str:
+        return query
+
+    run_query.__doc__ = description
+    return tool(run_query)
+
+
+def test_clients_are_reused_and_counted():
+    tools = [_make_tool("Run a SQL query.")]
+    first = utils.load_chat_model("m", tools=tools)
+    second = utils.load_chat_model("m", tools=tools)
+    other = utils.load_chat_model("m", model_kwargs={"temperature": 0}, tools=tools)
+
+    assert first is second and other is not first
+    stats = utils.model_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["clients"][0] == "stub:m tools=run_query"
+
+
+def test_changed_tool_schema_gets_a_new_client():
+    first = utils.load_chat_model("m", tools=[_make_tool("Run a SQL query.")])
+    second = utils.load_chat_model(
+        "m", tools=[_make_tool("Run a read-only SQL query.")]
+    )
+
+    assert first is not second
+    assert utils.model_cache_stats()["misses"] == 2
+
+
+def test_clear_model_cache():
+    utils.load_chat_model("m")
+    assert utils.clear_model_cache() == 1
+    utils.load_chat_model("m")
+    assert utils.model_cache_stats()["misses"] == 2
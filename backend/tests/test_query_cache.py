@@ -0,0 +1,61 @@
+import pytest
+
+from app.agent.query_cache import is_read_statement, normalize_sql, sql_fingerprint
+
+
+def test_formatting_differences_share_a_fingerprint():
+    variants = [
+        "SELECT title FROM film WHERE rating = 'PG';",
+        "select  title\n  from FILM\n where rating='PG'",
+        "-- top films\nSELECT title /* only PG */ FROM film WHERE rating = 'PG'",
+    ]
+    assert {normalize_sql(sql) for sql in variants} == {
+        "select title from film where rating='PG'"
+    }
+    assert len({sql_fingerprint(sql) for sql in variants}) == 1
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        ("SELECT 'PG' FROM film", "SELECT 'pg' FROM film"),
+        ('SELECT "Title" FROM film', 'SELECT "title" FROM film'),
+        ("SELECT 1 - -1", "SELECT 1 --1"),
+    ],
+)
+def test_literals_and_quoted_identifiers_are_kept(left, right):
+    assert normalize_sql(left) != normalize_sql(right)
+
+
+def test_comment_markers_inside_literals_are_not_comments():
+    assert (
+        normalize_sql("SELECT '--not a comment' FROM film")
+        == "select'--not a comment'from film"
+    )
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT count(*) FROM rental",
+        "  with recent AS (SELECT * FROM rental) SELECT count(*) FROM recent",
+        "-- monthly\n(SELECT 1) UNION (SELECT 2)",
+        "VALUES (1), (2)",
+        "TABLE film",
+    ],
+)
+def test_reads_are_recognized(sql):
+    assert is_read_statement(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "DELETE FROM rental",
+        "/* SELECT */ UPDATE film SET rating = 'G'",
+        "EXPLAIN ANALYZE SELECT 1",
+        "selection",
+    ],
+)
+def test_other_statements_are_not_reads(sql):
+    assert not is_read_statement(sql)
@@ -0,0 +1,37 @@
+import pytest
+
+from app.api.responses import _etag_matches, negotiate_coding
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip, deflate, br", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("zstd;q=0.5, gzip", "gzip"),
+        ("zstd;q=0, gzip;q=0", None),
+        ("*", "zstd"),
+        ("*;q=0.1, zstd;q=0", "gzip"),
+        ("GZIP;Q=1", "gzip"),
+        ("gzip;q=bogus", None),
+    ],
+)
+def test_negotiate_coding(accept_encoding, expected):
+    assert negotiate_coding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        ('"abc-json"', True),
+        ('W/"abc-json"', True),
+        ('"other", "abc-json"', True),
+        ("*", True),
+        ('"abc-json-gz"', False),
+        ("", False),
+    ],
+)
+def test_etag_matches(if_none_match, matches):
+    assert _etag_matches(if_none_match, '"abc-json"') is matches
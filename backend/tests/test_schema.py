@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app.agent.schema import SchemaCache
+
+
+@pytest.fixture
+def schema_cache():
+    cache = SchemaCache(create_engine("sqlite://"))
+    cache._schema, cache._fingerprint = {}, "loaded"
+    return cache
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "ALTER TABLE film ADD COLUMN x int",
+        "  drop index film_title_idx",
+        "-- add a column\nALTER TABLE film ADD COLUMN x int",
+        "/* migration 12 */ CREATE TABLE t (id int)",
+        "/* a */\n-- b\n  truncate rental",
+    ],
+)
+def test_ddl_invalidates_the_schema(schema_cache, statement):
+    schema_cache._on_execute(None, None, statement, None, None, False)
+    assert schema_cache._fingerprint is None
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "SELECT * FROM film",
+        "-- DROP TABLE film\nSELECT 1",
+        "SELECT 'ALTER TABLE film'",
+        "UPDATE film SET title = 'CREATE'",
+    ],
+)
+def test_other_statements_keep_the_schema(schema_cache, statement):
+    schema_cache._on_execute(None, None, statement, None, None, False)
+    assert schema_cache._fingerprint == "loaded"
@@ -0,0 +1,45 @@
+from app.db.slow_queries import REDACTED, SlowQueryLog, generic_statement
+
+
+def test_generic_statement_numbers_placeholders():
+    assert generic_statement("SELECT %s, %s") == "SELECT $1, $2"
+    assert (
+        generic_statement(
+            "SELECT * FROM film WHERE film_id = %(id)s OR length > "
+            "%(id)s AND rating = %(r)s"
+        )
+        == "SELECT * FROM film WHERE film_id = $1 OR length > $1 AND rating = $2"
+    )
+    # Escaped percent signs stay escaped for the driver
+    assert (
+        generic_statement("SELECT 1 WHERE title LIKE 'a%%'")
+        == "SELECT 1 WHERE title LIKE 'a%%'"
+    )
+
+
+def _record(log: SlowQueryLog, parameters) -> dict:
+    log.record(
+        "SELECT * FROM customer WHERE email = %(email)s",
+        parameters,
+        False,
+        900.0,
+        "sqlite",
+        False,
+    )
+    return log.entries()[0]
+
+
+def test_parameters_are_redacted_by_default():
+    log = SlowQueryLog(threshold_ms=500, size=10, explain_sample_rate=0)
+    assert _record(log, {"email": "mary.smith@example.org"})["parameters"] == REDACTED
+    assert _record(SlowQueryLog(500, 10, 0), None)["parameters"] is None
+
+
+def test_parameters_are_logged_when_enabled():
+    log = SlowQueryLog(
+        threshold_ms=500, size=10, explain_sample_rate=0, log_parameters=True
+    )
+    assert (
+        "mary.smith@example.org"
+        in _record(log, {"email": "mary.smith@example.org"})["parameters"]
+    )
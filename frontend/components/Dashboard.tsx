@@ -65,15 +65,24 @@ export function Dashboard() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // Fetch sales overview data
-        const salesResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/insights/sales-overview`);
-        const salesResult = await salesResponse.json();
-        if (salesResult.status === 'success') {
-          setSalesData(salesResult.data);
+        // Fetch every panel in one round trip; the backend computes them concurrently
+        const panels = "sales-overview,top-films,category-performance,regional-sales,customer-activity";
+        const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/insights/dashboard?panels=${panels}`);
+        const result = await response.json();
+        if (result.status !== 'success') {
+          return;
+        }
+        if (Object.keys(result.errors ?? {}).length > 0) {
+          console.error('Some dashboard panels failed to load:', result.errors);
+        }
+
+        const salesOverview: SalesData[] | undefined = result.data["sales-overview"];
+        if (salesOverview) {
+          setSalesData(salesOverview);
           // Calculate metrics
-          const totalRevenue = salesResult.data.reduce((sum: number, item: SalesData) => sum + item.Sales, 0);
-          const totalProfit = salesResult.data.reduce((sum: number, item: SalesData) => sum + item.Profit, 0);
-          const totalCustomers = salesResult.data.reduce((sum: number, item: SalesData) => sum + item.Customers, 0);
+          const totalRevenue = salesOverview.reduce((sum: number, item: SalesData) => sum + item.Sales, 0);
+          const totalProfit = salesOverview.reduce((sum: number, item: SalesData) => sum + item.Profit, 0);
+          const totalCustomers = salesOverview.reduce((sum: number, item: SalesData) => sum + item.Customers, 0);
           const avgOrderValue = (totalRevenue / totalCustomers).toFixed(2);
           const profitMargin = ((totalProfit / totalRevenue) * 100).toFixed(1);
 
@@ -86,33 +95,17 @@ export function Dashboard() {
             profitMargin: profitMargin + "%"
           });
         }
-
-        // Fetch top films data
-        const filmsResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/insights/top-films`);
-        const filmsResult = await filmsResponse.json();
-        if (filmsResult.status === 'success') {
-          setProductData(filmsResult.data);
+        if (result.data["top-films"]) {
+          setProductData(result.data["top-films"]);
         }
-
-        // Fetch category performance data
-        const categoryResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/insights/category-performance`);
-        const categoryResult = await categoryResponse.json();
-        if (categoryResult.status === 'success') {
-          setCategoryData(categoryResult.data);
+        if (result.data["category-performance"]) {
+          setCategoryData(result.data["category-performance"]);
         }
-
-        // Fetch regional sales data
-        const regionalResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/insights/regional-sales`);
-        const regionalResult = await regionalResponse.json();
-        if (regionalResult.status === 'success') {
-          setRegionalData(regionalResult.data);
+        if (result.data["regional-sales"]) {
+          setRegionalData(result.data["regional-sales"]);
         }
-
-        // Fetch customer activity data
-        const customerResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/insights/customer-activity`);
-        const customerResult = await customerResponse.json();
-        if (customerResult.status === 'success') {
-          setCustomerData(customerResult.data);
+        if (result.data["customer-activity"]) {
+          setCustomerData(result.data["customer-activity"]);
         }
       } catch (error) {
         console.error('Error fetching dashboard data:', error);